@@ -1,34 +1,42 @@
+import io
 import os
 import math
+import time
 import yaml
 import sys
 import argparse
 import pathlib
 import itertools
-
+import shutil
+import tempfile
+import traceback
+import hashlib
+import functools
+import json
+import mmap
+
+from collections import namedtuple
 from copy import copy
 from enum import Enum, IntEnum
 from abc import ABC
-import PIL
 
-from reportlab.lib import utils
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase.ttfonts import TTFError
-from reportlab.lib.units import mm
-from reportlab.lib.enums import TA_CENTER
-from reportlab.pdfgen import canvas
-from reportlab.graphics import renderPDF
-from reportlab.platypus import Frame, Paragraph, Table, TableStyle
-from reportlab.platypus.flowables import Flowable, Spacer, Image
-from reportlab.lib.styles import ParagraphStyle, StyleSheet1
+from reportlab.lib.units import mm, inch
 from reportlab.lib.enums import TA_CENTER
-from reportlab.lib.fonts import addMapping
-from reportlab.platypus.doctemplate import LayoutError
-from svglib.svglib import svg2rlg
+
+# The rest of reportlab, svglib, PIL and PyPDF2 are slow to import, so they are
+# only imported once something is actually drawn (or stitched). This keeps the
+# CLI (and scripts importing this module, like convert.py) quick to start.
 
 
 ASSET_DIR = pathlib.Path(__file__).parent.resolve() / "assets"
+# Resolution card art is downsampled to with --draft
+DRAFT_DPI = 30
+# Seconds between checks for changes with --watch
+WATCH_INTERVAL = 0.5
+CACHE_DIR = (
+    pathlib.Path(os.environ.get("XDG_CACHE_HOME", pathlib.Path.home() / ".cache"))
+    / "dnd-card-generator"
+)
 
 
 def ExistingFile(p):
@@ -40,11 +48,224 @@ def ExistingFile(p):
         raise argparse.ArgumentTypeError(f"`{p}` does not exist")
 
 
+def Spacing(spacing):
+    """Argparse type for the "X Y" spacing between cards on a sheet"""
+    from imposition import parse_spacing
+
+    try:
+        return parse_spacing(spacing)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+# Files larger than this are memory mapped rather than read in to be hashed
+MMAP_THRESHOLD = 1024 * 1024
+
+
+def hash_file(path):
+    """Returns the SHA1 hex digest of a file's contents"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size > MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                digest.update(data)
+        else:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+ImageInfo = namedtuple("ImageInfo", ["width", "height", "mode", "sha1"])
+
+
+class ImageIndex:
+    """Index of image dimensions, mode and content hash.
+
+    Entries are keyed by absolute path and only trusted while the file's
+    modification time and size are unchanged. The index can be persisted so
+    that images are only probed again when they change.
+    """
+
+    def __init__(self):
+        self.path = None
+        self._entries = {}
+        # Paths whose entries have already been checked against the file
+        # system during this run
+        self._verified = {}
+        self._dirty = False
+
+    def load(self, path):
+        self.path = pathlib.Path(path)
+        try:
+            with open(self.path, "r") as f:
+                self._entries.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        if self.path is None or not self._dirty:
+            return
+
+        # Merge with whatever other processes have written in the meantime
+        entries = {}
+        try:
+            with open(self.path, "r") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+        entries.update(self._entries)
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with open(temp_path, "w") as f:
+                json.dump(entries, f)
+            os.replace(temp_path, self.path)
+        except OSError:
+            # The index is only an optimisation, images are probed again
+            return
+        self._dirty = False
+
+    def forget(self, path=None):
+        """Re-check `path` (or every path) against the file system on next use"""
+        if path is None:
+            self._verified.clear()
+        else:
+            self._verified.pop(os.path.abspath(path), None)
+
+    def info(self, path):
+        path = os.path.abspath(path)
+        info = self._verified.get(path)
+        if info is not None:
+            return info
+
+        stat = os.stat(path)
+        entry = self._entries.get(path)
+        if (
+            entry is None
+            or entry["mtime"] != stat.st_mtime_ns
+            or entry["size"] != stat.st_size
+        ):
+            import PIL.Image
+
+            with PIL.Image.open(path) as image:
+                width, height = image.size
+                mode = image.mode
+            info = ImageInfo(width, height, mode, hash_file(path))
+            self._entries[path] = dict(
+                info._asdict(), mtime=stat.st_mtime_ns, size=stat.st_size
+            )
+            self._dirty = True
+        else:
+            info = ImageInfo(
+                entry["width"], entry["height"], entry["mode"], entry["sha1"]
+            )
+
+        self._verified[path] = info
+        return info
+
+
+image_index = ImageIndex()
+
+
+class ImageDerivatives:
+    """On-disk cache of images resampled for the size they are printed at.
+
+    Derivatives are keyed by the source's content hash, their pixel size and
+    DPI, so they are reused across runs and decks until the source changes.
+    """
+
+    def __init__(self, path=CACHE_DIR / "derivatives"):
+        self.path = path
+
+    def resample(self, path, width, height, dpi):
+        """Returns an image to print at `width` x `height` points and `dpi`.
+
+        If `path` is already at (or below) that resolution it is returned as
+        is, otherwise the path of a downsampled copy is returned, unless that
+        turns out bigger than the original. JPEGs are downsampled to JPEGs,
+        everything else to lossless PNGs.
+        """
+        info = image_index.info(path)
+
+        # The scale is rounded up to the nearest eighth so that images placed
+        # at slightly different sizes share a derivative. Images with less
+        # than twice the resolution needed aren't worth an extra copy.
+        scale = max(width / inch * dpi / info.width, height / inch * dpi / info.height)
+        scale = math.ceil(scale * 8) / 8
+        if scale > 0.5:
+            return path
+        size = (
+            max(1, round(info.width * scale)),
+            max(1, round(info.height * scale)),
+        )
+
+        name = "{}_{}x{}_{}dpi".format(info.sha1, size[0], size[1], dpi)
+        derivative_path = self.path / f"{name}.png"
+        jpeg_path = self.path / f"{name}.jpg"
+        if jpeg_path.exists():
+            derivative_path = jpeg_path
+        elif not derivative_path.exists():
+            import PIL.Image
+
+            with PIL.Image.open(path) as image:
+                if image.format == "JPEG" and image.mode in ("L", "RGB"):
+                    derivative_path, image_format = jpeg_path, "JPEG"
+                else:
+                    image_format = "PNG"
+                if image.mode not in ("L", "LA", "RGB", "RGBA"):
+                    image = image.convert("RGBA")
+                image = image.resize(size, PIL.Image.LANCZOS)
+            temp_path = derivative_path.with_name(
+                f"{derivative_path.stem}.{os.getpid()}.tmp"
+            )
+            try:
+                self.path.mkdir(parents=True, exist_ok=True)
+                image.save(temp_path, format=image_format, quality=90)
+                os.replace(temp_path, derivative_path)
+            except OSError:
+                # Without somewhere to keep it, the original is used
+                return path
+
+        if derivative_path.stat().st_size >= os.stat(path).st_size:
+            return path
+        return derivative_path
+
+
+image_derivatives = ImageDerivatives()
+
+
+class ImageRegistry:
+    """Draws images by their content, so that each distinct image is only read
+    and embedded once.
+
+    Images are identified by their content hash, so the same image under
+    different paths is drawn from a single path, which reportlab only embeds
+    once per document.
+    """
+
+    def __init__(self):
+        # First path seen for each content hash
+        self._paths = {}
+
+    def draw(self, canvas, path, x, y, width, height, mask=None):
+        info = image_index.info(path)
+        path = self._paths.setdefault(info.sha1, str(path))
+        canvas.drawImage(path, x, y, width, height, mask=mask)
+
+    def forget(self, path):
+        """Drops what is kept for `path`, e.g. once the file has changed"""
+        path = str(path)
+        for sha1 in [sha1 for sha1, seen in self._paths.items() if seen == path]:
+            del self._paths[sha1]
+
+
+image_registry = ImageRegistry()
+
+
 # Returns the best orientation for the given image aspect ration
 def best_orientation(image_path, card_width, card_height):
-    image = PIL.Image.open(image_path)
-    image_width, image_height = image.size
-    if (image_width > image_height) == (card_width > card_height):
+    info = image_index.info(image_path)
+    if (info.width > info.height) == (card_width > card_height):
         return Orientation.NORMAL
     else:
         return Orientation.TURN90
@@ -53,8 +274,8 @@ def best_orientation(image_path, card_width, card_height):
 # Returns the width and height an image should be to fit into the available
 # space, while maintaining aspect ratio
 def get_image_size(path, available_width, available_height):
-    img = utils.ImageReader(path)
-    image_width, image_height = img.getSize()
+    info = image_index.info(path)
+    image_width, image_height = info.width, info.height
 
     width_ratio = available_width / image_width
     height_ratio = available_height / image_height
@@ -63,6 +284,21 @@ def get_image_size(path, available_width, available_height):
     return (image_width * best_ratio, image_height * best_ratio)
 
 
+# Loads an SVG scaled to the given width. Parsing SVGs is slow, so each one is
+# only parsed once per run
+@functools.lru_cache(maxsize=None)
+def load_svg(path, width):
+    from svglib.svglib import svg2rlg
+
+    drawing = svg2rlg(path)
+    if drawing is not None:
+        factor = width / drawing.width
+        drawing.width *= factor
+        drawing.height *= factor
+        drawing.scale(factor, factor)
+    return drawing
+
+
 # TODO: Clean up the font object, it seems a bit crude
 # TODO: Also manage colours
 class Fonts(ABC):
@@ -72,6 +308,8 @@ class Fonts(ABC):
     FONT_DIR = ASSET_DIR / "fonts"
 
     def __init__(self):
+        from reportlab.lib.styles import ParagraphStyle, StyleSheet1
+
         self._register_fonts()
         self.paragraph_styles = StyleSheet1()
         self.paragraph_styles.add(
@@ -170,6 +408,10 @@ class FreeFonts(Fonts):
     }
 
     def _register_fonts(self):
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.lib.fonts import addMapping
+
         pdfmetrics.registerFont(
             TTFont("Universal Serif", self.FONT_DIR / "Universal Serif.ttf")
         )
@@ -190,6 +432,12 @@ class FreeFonts(Fonts):
         addMapping("ScalySans", 1, 1, "ScalySansBoldItalic")  # italic and bold
 
 
+# Fonts are registered on first use rather than at import time
+@functools.lru_cache(maxsize=None)
+def default_fonts():
+    return FreeFonts()
+
+
 class AccurateFonts(Fonts):
     FONT_SCALE = 1.41
 
@@ -206,6 +454,10 @@ class AccurateFonts(Fonts):
     }
 
     def _register_fonts(self):
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.lib.fonts import addMapping
+
         pdfmetrics.registerFont(
             TTFont("ModestoExpanded", self.FONT_DIR / "ModestoExpanded-Regular.ttf")
         )
@@ -234,76 +486,13 @@ class AccurateFonts(Fonts):
         addMapping("ModestoTextLight", 1, 1, "ModestoTextBoldItalic")  # italic and bold
 
 
-# Draws a line across the frame, unless it is at the top of the frame, in which
-# case nothing is drawn
-class LineDivider(Flowable):
-    def __init__(
-        self,
-        xoffset=0,
-        width=None,
-        fill_color="red",
-        line_height=0.25 * mm,
-        spacing=1 * mm,
-    ):
-        self.xoffset = xoffset
-        self.width = width
-        self.fill_color = fill_color
-        self.spacing = spacing
-        self.line_height = line_height
-        self.height = self.line_height + self.spacing
-
-    def _at_top(self):
-        at_top = False
-        frame = getattr(self, "_frame", None)
-        if frame:
-            at_top = getattr(frame, "_atTop", None)
-        return at_top
-
-    def wrap(self, *args):
-        if self._at_top():
-            return (0, 0)
-        else:
-            return (self.width, self.height)
-
-    def draw(self):
-        if not self._at_top():
-            canvas = self.canv
-            canvas.setFillColor(self.fill_color)
-            canvas.rect(self.xoffset, 0, self.width, self.line_height, stroke=0, fill=1)
-
-
-class KeepTogether(Flowable):
-    def __init__(self, flowables):
-        self.flowables = flowables
-        self._available_height = None
-        self._available_width = None
-
-    def wrap(self, aW, aH):
-        self._available_width = aW
-        self._available_height = aH
-
-        height = 0
-        width = 0
-        for flowable in self.flowables:
-            w, h = flowable.wrap(aW, 0xFFFFFFFF)
-            height += flowable.getSpaceBefore()
-            height += h
-            height += flowable.getSpaceAfter()
-            if w > width:
-                width = w
-        return width, height
-
-    def drawOn(self, canvas, x, y, _sW=0):
-        y -= self.flowables[0].getSpaceBefore()
-        for flowable in self.flowables[::-1]:
-            y += flowable.getSpaceBefore()
-            width, height = flowable.wrap(self._available_width, self._available_height)
-            flowable.drawOn(canvas, x, y, _sW=_sW)
-            y += height
-            y += flowable.getSpaceAfter()
-            self._available_height -= (
-                flowable.getSpaceBefore() + height + flowable.getSpaceBefore()
-            )
+# Frames only know how much space a flowable takes once it has been added, so
+# to measure a layout the flowables are added with their drawing switched off
+def _disable_drawing(flowable):
+    def mock(*args, **kwargs):
+        pass
+
+    flowable.drawOn = mock
 
 
 class Orientation(Enum):
@@ -346,13 +535,15 @@ class CardLayout(ABC):
         width=0,  # uninitialized
         height=0,  # uninitialized
         bleed=0,  # uninitialized
-        fonts=FreeFonts(),
+        fonts=None,  # defaults to FreeFonts
+        dpi=None,
+        logo=True,
     ):
         self.frames = []
         self.title = title
         self.subtitle = subtitle
         self.artist = artist
-        self.fonts = fonts
+        self.fonts = fonts or default_fonts()
         self.background_image_path = background
         self.border_color = border_color
         self.border_front = tuple([v + bleed for v in border_front])
@@ -360,6 +551,8 @@ class CardLayout(ABC):
         self.width = width + 2 * bleed
         self.height = height + 2 * bleed
         self.bleed = bleed
+        self.dpi = dpi
+        self.logo = logo
         self.front_image_path = os.path.abspath(image_path)
         self.front_orientation = best_orientation(
             self.front_image_path, self.width, self.height
@@ -379,10 +572,28 @@ class CardLayout(ABC):
         self.fill_frames(canvas)
         self._draw_frames(canvas, split)
 
+    def fits(self, canvas, split):
+        """Lays out the text frames without drawing anything to find out
+        whether the card's contents fit this layout"""
+        self.fill_frames(canvas)
+        try:
+            self._draw_frames(canvas, split, measure_only=True)
+            return True
+        except TemplateTooSmall:
+            return False
+        finally:
+            # Leave the layout ready to be drawn for real
+            self.elements = []
+            for frame in self.frames:
+                frame._reset()
+
     def fill_frames(self, canvas):
         pass
 
     def _draw_front_frame(self, canvas, width, height):
+        from reportlab.platypus import Frame, Spacer
+        from flowables import CardImage
+
         front_frame = Frame(
             self.border_front[Border.LEFT],
             self.border_front[Border.BOTTOM],
@@ -440,7 +651,14 @@ class CardLayout(ABC):
         if space > 0:
             elements.append(Spacer(front_frame.width, space / 2))
 
-        elements.append(Image(self.front_image_path, image_width, image_height))
+        image_path = self.front_image_path
+        if self.dpi is not None:
+            image_path = image_derivatives.resample(
+                image_path, image_width, image_height, self.dpi
+            )
+        elements.append(
+            CardImage(image_path, image_width, image_height, image_registry)
+        )
 
         # Add second spacer
         if space > 0:
@@ -449,7 +667,9 @@ class CardLayout(ABC):
         elements.append(title_paragraph)
         front_frame.addFromList(elements, canvas)
 
-    def _draw_frames(self, canvas, split=False):
+    def _draw_frames(self, canvas, split=False, measure_only=False):
+        from flowables import LineDivider
+
         frames = iter(self.frames)
         current_frame = next(frames)
 
@@ -478,6 +698,8 @@ class CardLayout(ABC):
             # DEBUG: Draw frame boundary
             # current_frame.drawBoundary(canvas)
 
+            if measure_only:
+                _disable_drawing(element)
             result = current_frame.add(element, canvas)
             if result == 0:
                 # Could not draw into current frame
@@ -486,7 +708,10 @@ class CardLayout(ABC):
                     remaining = current_frame.split(element, canvas)
                     if len(remaining):
                         # it can fit, so add the fragment that can fit
-                        current_frame.add(remaining.pop(0), canvas)
+                        fragment = remaining.pop(0)
+                        if measure_only:
+                            _disable_drawing(fragment)
+                        current_frame.add(fragment, canvas)
                         self.elements = remaining + self.elements
                         continue
 
@@ -505,6 +730,29 @@ class CardLayout(ABC):
     def _draw_front(self, canvas):
         canvas.saveState()
 
+        self._draw_chrome(
+            canvas, ("front", self.front_orientation), self._draw_front_chrome
+        )
+
+        width, height = self._orient_front(canvas)
+
+        self._draw_front_frame(canvas, width, height)
+
+        # Artist
+        if self.artist:
+            canvas.setFillColor("white")
+            artist_font_height = self.fonts.set_font(canvas, "artist")
+            canvas.drawCentredString(
+                width / 2,
+                self.border_front[Border.BOTTOM] - artist_font_height - 1 * mm,
+                "Artist: {}".format(self.artist),
+            )
+
+        canvas.restoreState()
+
+    def _draw_front_chrome(self, canvas):
+        from reportlab.graphics import renderPDF
+
         # Draw red border
         self._draw_single_border(canvas, 0, self.width, self.height)
 
@@ -518,23 +766,13 @@ class CardLayout(ABC):
             self.front_orientation,
         )
 
-        # Set card orientation
-        if self.front_orientation == Orientation.TURN90:
-            canvas.rotate(90)
-            canvas.translate(0, -self.width)
-            width = self.height
-            height = self.width
-        else:
-            width = self.width
-            height = self.height
+        width, height = self._orient_front(canvas)
 
         # D&D logo
-        dnd_logo = svg2rlg(ASSET_DIR / "logo.svg")
+        if not self.logo:
+            return
+        dnd_logo = load_svg(ASSET_DIR / "logo.svg", self.LOGO_WIDTH)
         if dnd_logo is not None:
-            factor = self.LOGO_WIDTH / dnd_logo.width
-            dnd_logo.width *= factor
-            dnd_logo.height *= factor
-            dnd_logo.scale(factor, factor)
             logo_margin = (
                 self.border_front[Border.TOP] - self.bleed - dnd_logo.height
             ) / 2
@@ -545,21 +783,18 @@ class CardLayout(ABC):
                 height - self.border_front[Border.TOP] + logo_margin,
             )
 
-        self._draw_front_frame(canvas, width, height)
-
-        # Artist
-        if self.artist:
-            canvas.setFillColor("white")
-            artist_font_height = self.fonts.set_font(canvas, "artist")
-            canvas.drawCentredString(
-                width / 2,
-                self.border_front[Border.BOTTOM] - artist_font_height - 1 * mm,
-                "Artist: {}".format(self.artist),
-            )
-
-        canvas.restoreState()
+    # Set card orientation, returns the width and height of the rotated front
+    def _orient_front(self, canvas):
+        if self.front_orientation == Orientation.TURN90:
+            canvas.rotate(90)
+            canvas.translate(0, -self.width)
+            return self.height, self.width
+        return self.width, self.height
 
     def _draw_back(self, canvas):
+        self._draw_chrome(canvas, ("back",), self._draw_back_chrome)
+
+    def _draw_back_chrome(self, canvas):
         # Draw red border
         self._draw_single_border(canvas, self.width, self.width, self.height)
 
@@ -568,6 +803,24 @@ class CardLayout(ABC):
             canvas, self.width, self.border_back, self.width, self.height
         )
 
+    # The border, parchment and logo are identical on every card sharing a
+    # layout, colour and bleed. They are drawn once into a form XObject which
+    # every later card just references.
+    def _draw_chrome(self, canvas, key, draw):
+        key = (
+            type(self).__name__,
+            self.border_color,
+            self.bleed,
+            str(self.background_image_path),
+            self.logo,
+        ) + key
+        name = "chrome_" + hashlib.md5(repr(key).encode()).hexdigest()
+        if not canvas.hasForm(name):
+            canvas.beginForm(name, 0, 0, self.width * 2, self.height)
+            draw(canvas)
+            canvas.endForm()
+        canvas.doForm(name)
+
     def _draw_single_border(self, canvas, x, width, height):
         canvas.saveState()
         canvas.setFillColor(self.border_color)
@@ -609,8 +862,8 @@ class CardLayout(ABC):
         canvas.clipPath(clipping_mask, stroke=0, fill=1)
 
         if self.background_image_path is not None:
-            canvas.drawImage(
-                self.background_image_path, x, 0, width=width, height=height, mask=None
+            image_registry.draw(
+                canvas, self.background_image_path, x, 0, width, height, mask=None
             )
 
         canvas.restoreState()
@@ -633,6 +886,8 @@ class SmallCard(CardLayout):
             **kwargs,
         )
 
+        from reportlab.platypus import Frame
+
         frame = Frame(
             # X
             self.width + self.border_back[Border.LEFT],
@@ -670,6 +925,8 @@ class LargeCard(CardLayout):
             **kwargs,
         )
 
+        from reportlab.platypus import Frame
+
         left_frame = Frame(
             # X
             self.width + self.border_back[Border.LEFT],
@@ -802,6 +1059,8 @@ class MonsterCardLayout(CardLayout):
         canvas.drawString(*self.source_location, self.source)
 
     def fill_frames(self, canvas):
+        from reportlab.platypus import Spacer, Table, TableStyle
+        from flowables import CachedParagraph, KeepTogether, LineDivider
 
         # Title font scaling
         custom_scale = (
@@ -817,7 +1076,7 @@ class MonsterCardLayout(CardLayout):
         # Title
         self.elements.append(Spacer(1 * mm, spacer_height))
         self.elements.append(
-            Paragraph(
+            CachedParagraph(
                 self.title,
                 style,
             )
@@ -825,7 +1084,7 @@ class MonsterCardLayout(CardLayout):
 
         # Subtitle
         self.elements.append(
-            Paragraph(
+            CachedParagraph(
                 self.subtitle,
                 self.fonts.paragraph_styles["subtitle"],
             )
@@ -833,13 +1092,13 @@ class MonsterCardLayout(CardLayout):
 
         top_stats = [
             [
-                Paragraph(
+                CachedParagraph(
                     "<b>AC:</b> {}<br/><b>Speed:</b> {}".format(
                         self.armor_class, self.speed
                     ),
                     self.fonts.paragraph_styles["text"],
                 ),
-                Paragraph(
+                CachedParagraph(
                     "<b>HP:</b> {}".format(self.max_hit_points),
                     self.fonts.paragraph_styles["text"],
                 ),
@@ -874,10 +1133,10 @@ class MonsterCardLayout(CardLayout):
         ]
         modifier_table_data = [
             [
-                Paragraph(a, self.fonts.paragraph_styles["modifier_title"])
+                CachedParagraph(a, self.fonts.paragraph_styles["modifier_title"])
                 for a in abilities
             ],
-            [Paragraph(m, self.fonts.paragraph_styles["modifier"]) for m in modifiers],
+            [CachedParagraph(m, self.fonts.paragraph_styles["modifier"]) for m in modifiers],
         ]
 
         t = Table(
@@ -903,11 +1162,11 @@ class MonsterCardLayout(CardLayout):
         text = ""
         for heading, body in (self.attributes or {}).items():
             text += "<b>{}:</b> {}<br/>".format(heading, body)
-        self.elements.append(Paragraph(text, self.fonts.paragraph_styles["text"]))
+        self.elements.append(CachedParagraph(text, self.fonts.paragraph_styles["text"]))
 
         # Abilities
         for heading, body in (self.abilities or {}).items():
-            paragraph = Paragraph(
+            paragraph = CachedParagraph(
                 "<i><b>{}.</b></i> {}".format(heading, body),
                 self.fonts.paragraph_styles["text"],
             )
@@ -923,10 +1182,10 @@ class MonsterCardLayout(CardLayout):
         )
 
         # Actions
-        title = Paragraph("ACTIONS", self.fonts.paragraph_styles["action_title"])
+        title = CachedParagraph("ACTIONS", self.fonts.paragraph_styles["action_title"])
         first_action = True
         for heading, body in (self.actions or {}).items():
-            paragraph = Paragraph(
+            paragraph = CachedParagraph(
                 "<i><b>{}.</b></i> {}".format(heading, body),
                 self.fonts.paragraph_styles["text"],
             )
@@ -947,10 +1206,10 @@ class MonsterCardLayout(CardLayout):
                 )
             )
 
-            title = Paragraph("REACTIONS", self.fonts.paragraph_styles["action_title"])
+            title = CachedParagraph("REACTIONS", self.fonts.paragraph_styles["action_title"])
             first_reaction = True
             for heading, body in (self.reactions or {}).items():
-                paragraph = Paragraph(
+                paragraph = CachedParagraph(
                     "<i><b>{}.</b></i> {}".format(heading, body),
                     self.fonts.paragraph_styles["text"],
                 )
@@ -970,18 +1229,18 @@ class MonsterCardLayout(CardLayout):
                 )
             )
 
-            title = Paragraph(
+            title = CachedParagraph(
                 "LEGENDARY ACTIONS", self.fonts.paragraph_styles["action_title"]
             )
             first_legendary = True
             for entry in self.legendary or []:
                 if type(entry) == str:
-                    paragraph = Paragraph(
+                    paragraph = CachedParagraph(
                         entry,
                         self.fonts.paragraph_styles["text"],
                     )
                 elif type(entry) == dict:
-                    paragraph = Paragraph(
+                    paragraph = CachedParagraph(
                         "<i><b>{}.</b></i> {}".format(*list(entry.items())[0]),
                         self.fonts.paragraph_styles["legendary_action"],
                     )
@@ -998,6 +1257,8 @@ class MonsterCardLayout(CardLayout):
                 self.elements.append(element)
 
     def _get_title_paragraph(self):
+        from flowables import CachedParagraph
+
         # Title font scaling
         custom_scale = (
             min(1.0, 20 / len(self.title)) if isinstance(self, SmallCard) else 1.0
@@ -1009,7 +1270,7 @@ class MonsterCardLayout(CardLayout):
         style.leading = font_size
 
         # Title
-        return Paragraph(
+        return CachedParagraph(
             self.title,
             style,
         )
@@ -1054,13 +1315,15 @@ class ItemCardLayout(CardLayout):
             )
 
     def fill_frames(self, canvas):
+        from reportlab.platypus import Spacer
+        from flowables import CachedParagraph
 
         # Title
         self.elements.append(self._get_title_paragraph())
 
         # Subtitle
         self.elements.append(
-            Paragraph(
+            CachedParagraph(
                 self.subtitle,
                 self.fonts.paragraph_styles["subtitle"],
             )
@@ -1071,7 +1334,7 @@ class ItemCardLayout(CardLayout):
 
         if type(self.description) == str:
             self.elements.append(
-                Paragraph(self.description, self.fonts.paragraph_styles["text"])
+                CachedParagraph(self.description, self.fonts.paragraph_styles["text"])
             )
             return
         if type(self.description) != list:
@@ -1082,7 +1345,7 @@ class ItemCardLayout(CardLayout):
         for entry in self.description:
             if type(entry) == str:
                 self.elements.append(
-                    Paragraph(entry, self.fonts.paragraph_styles["text"])
+                    CachedParagraph(entry, self.fonts.paragraph_styles["text"])
                 )
             if type(entry) == dict:
                 for title, description in entry.items():
@@ -1092,7 +1355,7 @@ class ItemCardLayout(CardLayout):
                         text += f" {description}"
 
                     self.elements.append(
-                        Paragraph(
+                        CachedParagraph(
                             text,
                             self.fonts.paragraph_styles["text"],
                         )
@@ -1101,7 +1364,9 @@ class ItemCardLayout(CardLayout):
             # TODO: Tables
 
     def _get_title_paragraph(self):
-        return Paragraph(
+        from flowables import CachedParagraph
+
+        return CachedParagraph(
             self.title,
             self.fonts.paragraph_styles["title"],
         )
@@ -1153,20 +1418,28 @@ class CardGenerator(ABC):
         self._args = args
         self._kwargs = kwargs
 
-    def draw(self, canvas):
+    def layout(self, canvas):
+        """Finds the first size (and split mode) that fits the card, without
+        drawing anything"""
         for size, split in itertools.product(self.sizes, [False, True]):
-            try:
-                card_layout = size(*self._args, **self._kwargs)
-                card_layout.draw(canvas, split)
-                canvas.showPage()
-                break
-            except TemplateTooSmall:
-                # Reset the page
-                canvas._restartAccumulators()
-                canvas.init_graphics_state()
-                canvas.state_stack = []
-        else:
+            card_layout = size(*self._args, **self._kwargs)
+            if card_layout.fits(canvas, split):
+                return card_layout, split
+        return None, None
+
+    def draw(self, canvas, route=None):
+        """Draws the card on `canvas`, or on the canvas returned by `route`
+        (given the layout the card fits) if there is one"""
+        card_layout, split = self.layout(canvas)
+        if card_layout is None:
             print("Could not fit {}".format(self._kwargs["title"]))
+            return False
+
+        if route is not None:
+            canvas = route(card_layout)
+        card_layout.draw(canvas, split)
+        canvas.showPage()
+        return True
 
 
 class MonsterCard(CardGenerator):
@@ -1177,8 +1450,810 @@ class ItemCard(CardGenerator):
     sizes = [ItemCardSmall]  # maybe more in the future
 
 
-if __name__ == "__main__":
+@functools.lru_cache(maxsize=None)
+def load_fonts(name):
+    """Instantiates (and registers) the fonts chosen on the command line"""
+    from reportlab.pdfbase.ttfonts import TTFError
+
+    if name == "accurate":
+        try:
+            return AccurateFonts()
+        except TTFError:
+            raise Exception(
+                "Failed to load accurate fonts, are you sure you used the correct file names?"
+            )
+    return default_fonts()
+
+
+if yaml.__with_libyaml__:
+    from yaml.cyaml import CParser
 
+    # libyaml's parser, with the pure Python composer so that entries can be
+    # composed one at a time
+    class DeckLoader(
+        CParser,
+        yaml.composer.Composer,
+        yaml.constructor.SafeConstructor,
+        yaml.resolver.Resolver,
+    ):
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            yaml.composer.Composer.__init__(self)
+            yaml.constructor.SafeConstructor.__init__(self)
+            yaml.resolver.Resolver.__init__(self)
+
+else:
+    DeckLoader = yaml.SafeLoader
+
+
+def iter_entries(stream):
+    """Yields the entries of a YAML deck one at a time, as soon as each one
+    has been parsed"""
+    loader = DeckLoader(stream)
+    try:
+        loader.get_event()  # Stream start
+        if loader.check_event(yaml.StreamEndEvent):
+            return
+        loader.get_event()  # Document start
+
+        if not loader.check_event(yaml.SequenceStartEvent):
+            # Not a list of entries, let the caller deal with whatever it is
+            yield from loader.construct_document(loader.compose_node(None, None))
+            return
+
+        loader.get_event()
+        while not loader.check_event(yaml.SequenceEndEvent):
+            node = loader.compose_node(None, None)
+            yield loader.construct_document(node)
+    finally:
+        loader.dispose()
+
+
+PLACEHOLDER_IMAGES = {
+    "monster": ASSET_DIR / "placeholder_monster.png",
+    "item": ASSET_DIR / "placeholder_item.png",
+}
+
+
+def resolve_image_path(entry, args):
+    """Returns the absolute path of an entry's image (or the placeholder)"""
+    # Entries loaded from a compiled deck already know where their image is
+    resolved = getattr(entry, "resolved_image_path", None)
+    if resolved is not None and resolved.exists():
+        return resolved
+
+    if "image_path" not in entry:
+        return PLACEHOLDER_IMAGES[args.type]
+
+    image_path = pathlib.Path(entry["image_path"])
+    if not image_path.is_absolute():
+        image_path = (args.input.parent / image_path).absolute()
+    if not image_path.exists():
+        raise ValueError(
+            "Invalid `image_path` in `{}`: {}".format(
+                entry["title"], entry["image_path"]
+            )
+        )
+    return image_path
+
+
+class DeckEntry(dict):
+    """An entry loaded from a compiled deck, along with the path its image
+    was resolved to when the deck was compiled (None for the placeholder)"""
+
+    resolved_image_path = None
+
+
+class DeckCache:
+    """Cache of decks compiled to a binary form that loads much faster than
+    parsing the YAML.
+
+    Each deck is kept along with the modification time, size and content hash
+    of its YAML, and where each entry's image is. A compiled deck is used as
+    long as the YAML's modification time and size are unchanged, or its
+    content is (e.g. after it has been copied or touched), and it was compiled
+    by the same version of the code.
+
+    A compiled deck is a header followed by one pickle per entry, written as
+    the entries are parsed, and ends with None. Only the types the YAML loader
+    produces are loaded back; anything else means the deck is compiled again.
+    """
+
+    VERSION = 2
+
+    # Classes (besides builtins pickle handles itself) a compiled deck may use
+    CLASSES = {
+        ("datetime", name) for name in ("date", "datetime", "timedelta", "timezone")
+    }
+
+    def __init__(self, path=CACHE_DIR / "decks"):
+        self.path = path
+
+    def _cache_path(self, input_path):
+        name = hashlib.sha1(str(input_path).encode()).hexdigest()
+        return self.path / f"{name}.pickle"
+
+    def _header(self, input_path, stat, sha1):
+        return dict(
+            version=self.VERSION,
+            code=code_version(),
+            path=str(input_path),
+            mtime=stat.st_mtime_ns,
+            size=stat.st_size,
+            sha1=sha1,
+        )
+
+    def load(self, input_path):
+        """Returns the entries of the deck at `input_path`, or None if it
+        hasn't been compiled since it last changed"""
+        import pickle
+
+        classes = self.CLASSES
+
+        class Unpickler(pickle.Unpickler):
+            def find_class(self, module, name):
+                if (module, name) not in classes:
+                    raise pickle.UnpicklingError(f"{module}.{name} is not allowed")
+                return super().find_class(module, name)
+
+        input_path = pathlib.Path(input_path).absolute()
+        cache_path = self._cache_path(input_path)
+        stat = os.stat(input_path)
+        try:
+            with open(cache_path, "rb") as f:
+                # Each pickle numbers its objects from scratch, so each gets
+                # an unpickler of its own
+                header = Unpickler(f).load()
+                expected = self._header(input_path, stat, None)
+                if not isinstance(header, dict) or any(
+                    header.get(key) != expected[key]
+                    for key in ("version", "code", "path")
+                ):
+                    return None
+
+                entries = []
+                while True:
+                    record = Unpickler(f).load()
+                    if record is None:
+                        break
+                    if type(record) is not tuple or len(record) != 2:
+                        return None
+                    entry, image_path = record
+                    if image_path is not None and not isinstance(image_path, str):
+                        return None
+                    if type(entry) is dict:
+                        entry = DeckEntry(entry)
+                        if image_path is not None:
+                            entry.resolved_image_path = pathlib.Path(image_path)
+                    entries.append(entry)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+            return None
+
+        if (stat.st_mtime_ns, stat.st_size) != (header["mtime"], header["size"]):
+            if header["sha1"] != hash_file(input_path):
+                return None
+            # Same content, so it is quicker to check next time
+            records = [
+                (entry, getattr(entry, "resolved_image_path", None))
+                for entry in entries
+            ]
+            for _ in self._save(
+                cache_path, self._header(input_path, stat, header["sha1"]), records
+            ):
+                pass
+        return entries
+
+    def compile(self, args):
+        """Yields the entries of the deck at `args.input` as they are parsed,
+        compiling the deck as they are"""
+        input_path = pathlib.Path(args.input).absolute()
+        stat = os.stat(input_path)
+        header = self._header(input_path, stat, hash_file(input_path))
+
+        def records():
+            with open(input_path, "r") as stream:
+                for entry in iter_entries(stream):
+                    image_path = None
+                    if isinstance(entry, dict) and "image_path" in entry:
+                        try:
+                            image_path = resolve_image_path(entry, args)
+                        except (ValueError, TypeError):
+                            # Reported when the card is drawn
+                            pass
+                    yield entry, image_path
+
+        # The YAML changed while it was being read if its modification time
+        # did, so the hash may not match
+        yield from self._save(
+            self._cache_path(input_path),
+            header,
+            records(),
+            lambda: os.stat(input_path).st_mtime_ns == stat.st_mtime_ns,
+        )
+
+    def _save(self, cache_path, header, records, valid=lambda: True):
+        """Writes a compiled deck out as its `records` (pairs of entry and
+        image path) are produced, yielding each entry. Saving is best effort,
+        and the deck is only kept if it is complete and `valid()`."""
+        import pickle
+
+        temp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        f = None
+
+        def write(obj):
+            nonlocal f
+            if f is None:
+                return
+            try:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except OSError:
+                # The deck is just parsed again next time
+                f.close()
+                f = None
+
+        try:
+            try:
+                self.path.mkdir(parents=True, exist_ok=True)
+                f = open(temp_path, "wb")
+            except OSError:
+                pass
+            write(header)
+            for entry, image_path in records:
+                # Only builtin types are loaded back
+                record = dict(entry) if isinstance(entry, DeckEntry) else entry
+                write((record, None if image_path is None else str(image_path)))
+                yield entry
+            write(None)
+
+            if f is not None:
+                try:
+                    f.close()
+                    if valid():
+                        os.replace(temp_path, cache_path)
+                except OSError:
+                    pass
+                f = None
+        finally:
+            if f is not None:
+                f.close()
+            try:
+                temp_path.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+
+deck_cache = DeckCache()
+
+
+def load_deck(args):
+    """Yields the entries of the deck at `args.input`, from its compiled form
+    if it hasn't changed since it was last compiled"""
+    entries = deck_cache.load(args.input)
+    if entries is None:
+        entries = deck_cache.compile(args)
+    yield from entries
+
+
+def create_card(entry, args, fonts):
+    """Builds the card generator for a single YAML entry, using the options in
+    `args` as parsed from the command line"""
+    image_path = resolve_image_path(entry, args)
+
+    if args.type == "monster":
+        return MonsterCard(
+            title=entry["title"],
+            subtitle=entry["subtitle"],
+            artist=entry.get("artist", None),
+            image_path=image_path,
+            background=args.background,
+            armor_class=entry["armor_class"],
+            max_hit_points=entry["max_hit_points"],
+            speed=entry["speed"],
+            strength=entry["strength"],
+            dexterity=entry["dexterity"],
+            constitution=entry["constitution"],
+            intelligence=entry["intelligence"],
+            wisdom=entry["wisdom"],
+            charisma=entry["charisma"],
+            challenge_rating=entry["challenge_rating"],
+            experience_points=entry["experience_points"],
+            source=entry.get("source", ""),
+            attributes=entry["attributes"],
+            abilities=entry.get("abilities", None),
+            actions=entry.get("actions", None),
+            reactions=entry.get("reactions", None),
+            legendary=entry.get("legendary", None),
+            fonts=fonts,
+            border_color=entry.get("color", "red"),
+            bleed=args.bleed,
+            dpi=args.dpi,
+            logo=not args.draft,
+        )
+    elif args.type == "item":
+        return ItemCard(
+            title=entry["title"],
+            subtitle=entry["subtitle"],
+            artist=entry.get("artist", None),
+            image_path=image_path,
+            background=args.background,
+            description=entry["description"],
+            category=entry["category"],
+            subcategory=entry.get("subcategory", None),
+            fonts=fonts,
+            border_color=entry.get("color", "red"),
+            bleed=args.bleed,
+            dpi=args.dpi,
+            logo=not args.draft,
+        )
+    raise ValueError(f"Unknown card type `{args.type}`")
+
+
+def use_cache_dir(cache_dir):
+    """Points the persistent caches at `cache_dir`"""
+    image_index.load(cache_dir / "images.json")
+    image_derivatives.path = cache_dir / "derivatives"
+    deck_cache.path = cache_dir / "decks"
+
+
+def new_canvas(output_path, args):
+    # Drafts are only looked at once, compressing them isn't worth the time
+    page_compression = 0 if args.draft else None
+
+    if args.nup is not None:
+        from imposition import ImposedCanvas
+
+        return ImposedCanvas(
+            str(output_path),
+            args.nup,
+            args.margin,
+            pageCompression=page_compression,
+        )
+
+    from reportlab.pdfgen import canvas
+
+    return canvas.Canvas(
+        str(output_path), pagesize=(0, 0), pageCompression=page_compression
+    )
+
+
+# Names of the card sizes, as used by split-by-size.py. Subclasses go before
+# the classes they extend.
+SIZE_NAMES = {
+    SuperEpicCard: "Super_Epic",
+    EpicCard: "Epic",
+    LargeCard: "Large",
+    SmallCard: "Small",
+}
+
+
+def size_name(card_layout):
+    for layout_class, name in SIZE_NAMES.items():
+        if isinstance(card_layout, layout_class):
+            return name
+    raise ValueError(f"Unknown card size `{type(card_layout).__name__}`")
+
+
+def draw_cards_by_size(entries, output_path, args, fonts):
+    """Draws every entry, in order, into a separate PDF for each card size,
+    named `{output}_{size}.pdf`. A manifest of which card went where is
+    written to `{output}_manifest.json`. Returns whether each entry fit on a
+    card."""
+    from reportlab.pdfgen import canvas
+
+    base = output_path.with_suffix("")
+    canvases = {}
+    pages = {}
+    manifest = []
+
+    # Cards are laid out before it is known which canvas they go on, which
+    # only needs (but doesn't draw anything on) a canvas
+    scratch = canvas.Canvas(io.BytesIO())
+
+    def route(card_layout):
+        name = size_name(card_layout)
+        if name not in canvases:
+            path = base.with_name(f"{base.name}_{name}.pdf")
+            canvases[name] = (new_canvas(path, args), path)
+            pages[name] = 0
+        pages[name] += 1
+        manifest[-1].update(
+            layout=type(card_layout).__name__,
+            size=name,
+            file=canvases[name][1].name,
+            card=pages[name],
+        )
+        return canvases[name][0]
+
+    drawn = []
+    for entry in entries:
+        manifest.append(
+            {
+                "title": entry["title"],
+                "layout": None,
+                "size": None,
+                "file": None,
+                "card": None,
+            }
+        )
+        card = create_card(entry, args, fonts)
+        drawn.append(card.draw(scratch, route))
+
+    for pdf, _ in canvases.values():
+        pdf.save()
+    with open(base.with_name(f"{base.name}_manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return drawn
+
+
+def draw_cards(entries, output_path, args, fonts):
+    """Draws every entry, in order, onto a single canvas saved to
+    `output_path`. Returns whether each entry fit on a card (and so got a
+    page, or a place on a sheet when `args.nup` is set)."""
+    if args.split_by_size:
+        return draw_cards_by_size(entries, output_path, args, fonts)
+
+    pdf = new_canvas(output_path, args)
+    drawn = []
+    for entry in entries:
+        card = create_card(entry, args, fonts)
+        drawn.append(card.draw(pdf))
+    pdf.save()
+    return drawn
+
+
+def render_cards(entries, output_path, args, fonts):
+    """Draws every entry, in order, into a new PDF at `output_path`. Returns
+    whether each entry fit on a card (and so got a page).
+
+    A canvas keeps every page in memory until it is saved. When `args.stream`
+    is set, only that many cards are drawn onto each canvas, and the pages of
+    each batch are copied into the output as soon as it is done, so memory use
+    doesn't grow with the size of the deck.
+    """
+    if args.stream is None:
+        return draw_cards(entries, output_path, args, fonts)
+
+    from pdfstitch import PdfStitcher
+
+    entries = iter(entries)
+    drawn = []
+    with tempfile.TemporaryDirectory() as tempdir, PdfStitcher(
+        output_path
+    ) as output:
+        batch_path = pathlib.Path(tempdir) / "batch.pdf"
+        while True:
+            batch = list(itertools.islice(entries, args.stream))
+            if not batch:
+                break
+            batch_drawn = draw_cards(batch, batch_path, args, fonts)
+            if any(batch_drawn):
+                # Images, forms etc. that are identical to ones from an
+                # earlier batch are only written once
+                output.append(batch_path)
+            drawn += batch_drawn
+    return drawn
+
+
+# Fonts are registered once per worker process rather than once per chunk
+_worker_fonts = None
+
+
+def _init_worker(args):
+    global _worker_fonts
+    _worker_fonts = load_fonts(args.fonts)
+    use_cache_dir(args.cache_dir)
+
+
+def _render_chunk(job):
+    entries, output_path, args = job
+    drawn = render_cards(entries, output_path, args, _worker_fonts)
+    image_index.save()
+    return output_path, drawn
+
+
+def render_chunks(entries, args, tempdir):
+    """Draws the entries using `args.jobs` worker processes.
+
+    Each worker renders a contiguous slice of the deck into its own PDF in
+    `tempdir`. Returns the path of each slice's PDF, in order, along with
+    whether each of its entries got a page.
+    """
+    import multiprocessing
+
+    entries = list(entries)
+    chunk_size = max(1, math.ceil(len(entries) / args.jobs))
+    chunks = [
+        (entries[start : start + chunk_size], tempdir / f"{i}.pdf", args)
+        for i, start in enumerate(range(0, len(entries), chunk_size))
+    ]
+
+    with multiprocessing.Pool(
+        args.jobs, initializer=_init_worker, initargs=(args,)
+    ) as pool:
+        return pool.map(_render_chunk, chunks, chunksize=1)
+
+
+def render_cards_parallel(entries, args):
+    """Draws the entries in worker processes, then stitches the slices back
+    together in input order so the result has the same pages as a serial run.
+    """
+    from pdfstitch import stitch_pdfs
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        chunks = render_chunks(entries, args, pathlib.Path(tempdir))
+        stitch_pdfs([path for path, _ in chunks], args.output_path)
+
+
+# Version of the format cards are cached in by --incremental and --watch
+CARD_CACHE_VERSION = 2
+
+# Modules whose code decides what a card looks like
+DRAWING_MODULES = ["CardGenerator.py", "flowables.py", "pdfstitch.py"]
+
+
+# Hash of the layout code, so that cached cards are redrawn when it changes
+@functools.lru_cache(maxsize=None)
+def code_version():
+    digest = hashlib.sha1()
+    for name in DRAWING_MODULES:
+        digest.update(hash_file(pathlib.Path(__file__).parent / name).encode())
+    return digest.hexdigest()
+
+
+def card_hash(entry, args):
+    """Hashes everything that goes into drawing a card"""
+    background = None
+    if args.background is not None:
+        background = image_index.info(args.background).sha1
+
+    digest = hashlib.sha1()
+    for part in (
+        code_version(),
+        args.type,
+        args.fonts,
+        args.bleed,
+        args.dpi,
+        args.draft,
+        background,
+        image_index.info(resolve_image_path(entry, args)).sha1,
+        json.dumps(entry, sort_keys=True, default=str),
+    ):
+        digest.update(repr(part).encode())
+    return digest.hexdigest()
+
+
+def card_cache_paths(args):
+    """Returns where the cards of the deck at `args.input` are cached: a PDF
+    and its index"""
+    name = hashlib.sha1(str(pathlib.Path(args.input).absolute()).encode()).hexdigest()
+    cards_dir = args.cache_dir / "cards"
+    return cards_dir / f"{name}.pdf", cards_dir / f"{name}.json"
+
+
+def load_card_cache(args):
+    """Returns the cached cards of the deck at `args.input`: the page each
+    card's hash is on in the cached PDF (None if it didn't fit), or an empty
+    dict if they can't be used"""
+    pdf_path, index_path = card_cache_paths(args)
+    try:
+        with open(index_path, "r") as f:
+            index = json.load(f)
+        stat = os.stat(pdf_path)
+        if index["version"] == CARD_CACHE_VERSION and index["pdf"] == [
+            stat.st_mtime_ns,
+            stat.st_size,
+        ]:
+            return index["cards"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return {}
+
+
+def save_card_cache(args, cards):
+    """Keeps the output, just drawn from the cards in `cards` (the page of
+    each card's hash), as the deck's cached cards"""
+    pdf_path, index_path = card_cache_paths(args)
+    try:
+        pdf_path.parent.mkdir(parents=True, exist_ok=True)
+        # Earlier versions kept each card in a PDF of its own
+        for path in pdf_path.parent.glob("*.pdf"):
+            if not path.with_suffix(".json").exists():
+                path.unlink()
+
+        temp_path = pdf_path.with_name(f"{pdf_path.name}.{os.getpid()}.tmp")
+        shutil.copyfile(args.output_path, temp_path)
+        os.replace(temp_path, pdf_path)
+
+        stat = os.stat(pdf_path)
+        temp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+        with open(temp_path, "w") as f:
+            json.dump(
+                {
+                    "version": CARD_CACHE_VERSION,
+                    "pdf": [stat.st_mtime_ns, stat.st_size],
+                    "cards": cards,
+                },
+                f,
+            )
+        os.replace(temp_path, index_path)
+    except OSError:
+        # The cards are just drawn again next time
+        pass
+
+
+def render_cards_incremental(entries, args):
+    """Draws the entries, reusing cards rendered by previous runs. Returns how
+    many cards were drawn, and how many there are.
+
+    The cards of a deck are cached as a copy of the last PDF drawn from it,
+    along with the page each card is on, by a hash of everything that goes
+    into drawing it. Only cards whose hash is not in there get drawn, then all
+    of the cards are stitched together in order. What the cards share (the
+    background, fonts...) is only kept once, and cards that are no longer in
+    the deck are dropped from the cache every time it is drawn.
+    """
+    from PyPDF2 import PdfReader
+    from pdfstitch import PdfStitcher
+
+    cached = load_card_cache(args)
+
+    hashes = []
+    missing = {}
+    for entry in entries:
+        key = card_hash(entry, args)
+        hashes.append(key)
+        if key not in cached and key not in missing:
+            missing[key] = entry
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        tempdir = pathlib.Path(tempdir)
+
+        # The page (of a PDF) each card's hash is on, None if it didn't fit
+        pages = {}
+        if cached:
+            reader = PdfReader(card_cache_paths(args)[0])
+            for key in set(hashes) - missing.keys():
+                page = cached[key]
+                pages[key] = None if page is None else reader.pages[page]
+
+        if missing:
+            if args.jobs > 1:
+                chunks = render_chunks(missing.values(), args, tempdir)
+            else:
+                drawn = render_cards(
+                    missing.values(), tempdir / "0.pdf", args, load_fonts(args.fonts)
+                )
+                chunks = [(tempdir / "0.pdf", drawn)]
+
+            # `drawn` goes first in zip() so that it doesn't take an extra key
+            # from the shared iterator when a chunk runs out
+            keys = iter(missing)
+            for chunk_path, drawn in chunks:
+                chunk_pages = iter(PdfReader(chunk_path).pages)
+                for fits, key in zip(drawn, keys):
+                    pages[key] = next(chunk_pages) if fits else None
+
+        # Every entry gets its page, including entries that are the same
+        cards = {}
+        temp_path = args.output_path.with_name(
+            f"{args.output_path.name}.{os.getpid()}.tmp"
+        )
+        with PdfStitcher(temp_path) as stitcher:
+            for key in hashes:
+                if key not in cards:
+                    cards[key] = None if pages[key] is None else len(stitcher)
+                if pages[key] is not None:
+                    stitcher.add_page(pages[key])
+        os.replace(temp_path, args.output_path)
+
+    save_card_cache(args, cards)
+    return len(missing), len(hashes)
+
+
+def render_deck(args):
+    """Renders the deck in `args.input` to `args.output_path`, the way the
+    command line options ask for"""
+    entries = load_deck(args)
+    if args.incremental:
+        render_cards_incremental(entries, args)
+    elif args.jobs > 1:
+        render_cards_parallel(entries, args)
+    else:
+        render_cards(entries, args.output_path, args, load_fonts(args.fonts))
+
+
+def deck_files(args):
+    """Returns the files a deck is drawn from: the YAML, the background and
+    every card's image"""
+    files = {pathlib.Path(args.input).absolute()}
+    if args.background is not None:
+        files.add(pathlib.Path(args.background).absolute())
+    try:
+        for entry in load_deck(args):
+            try:
+                files.add(resolve_image_path(entry, args))
+            except (ValueError, TypeError, KeyError):
+                # Reported when the deck is drawn
+                pass
+    except yaml.YAMLError:
+        pass
+    return files
+
+
+def file_stats(files):
+    """Returns the modification time and size of each file (None if it is
+    missing)"""
+    stats = {}
+    for path in files:
+        try:
+            stat = os.stat(path)
+            stats[path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stats[path] = None
+    return stats
+
+
+class DeckWatcher:
+    """Renders a deck every time it, or any file it uses, changes.
+
+    Everything that has been loaded stays in memory between renders: the
+    fonts, images, logos and laid out paragraphs. The cards are cached like
+    they are with --incremental (see `render_cards_incremental()`), so each
+    time the deck changes only the cards whose hash (see `card_hash()`)
+    changed are drawn again.
+    """
+
+    def __init__(self, args, interval=WATCH_INTERVAL):
+        self.args = args
+        self.interval = interval
+        self.stats = {}
+
+    def changed(self):
+        """Returns the files that changed since the last render"""
+        stats = file_stats(self.stats)
+        return [path for path, stat in stats.items() if stat != self.stats[path]]
+
+    def render(self, changed=()):
+        args = self.args
+        for path in changed:
+            image_index.forget(path)
+            image_registry.forget(path)
+
+        # Check the files before reading them, so that changes made while the
+        # deck is being drawn trigger another render
+        self.stats = file_stats(deck_files(args))
+
+        drawn, total = render_cards_incremental(load_deck(args), args)
+        image_index.save()
+        return drawn, total
+
+    def run(self):
+        changed = []
+        while True:
+            start = time.perf_counter()
+            try:
+                drawn, total = self.render(changed)
+            except Exception:
+                # Whatever was wrong (e.g. an image saved halfway) is likely to
+                # be fixed by the next change
+                traceback.print_exc()
+                print("Could not render the deck")
+            else:
+                print(
+                    f"Drew {drawn} of {total} cards to {self.args.output_path} "
+                    f"in {time.perf_counter() - start:.1f}s"
+                )
+            print("Waiting for changes...")
+
+            changed = []
+            while not changed:
+                time.sleep(self.interval)
+                changed = self.changed()
+
+
+def build_parser(input_required=True):
+    """Returns the parser for the command line options. Other scripts drawing
+    cards may leave the input out."""
     parser = argparse.ArgumentParser(description="Generate D&D cards.")
     parser.add_argument(
         "-t",
@@ -1203,6 +2278,7 @@ if __name__ == "__main__":
         "input",
         help="Path to input YAML file",
         action="store",
+        nargs=None if input_required else "?",
         type=ExistingFile,
     )
     parser.add_argument(
@@ -1239,83 +2315,181 @@ if __name__ == "__main__":
         type=ExistingFile,
     )
 
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Number of worker processes to render cards with.",
+        action="store",
+        default=1,
+        type=int,
+    )
+
+    parser.add_argument(
+        "--dpi",
+        help="Resample card art down to this resolution for the size it is printed at.",
+        action="store",
+        default=None,
+        type=int,
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        help="Only redraw cards that changed since the last run, reusing the rest from the cache.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory to keep caches (e.g. image information, compiled decks) in between runs.",
+        action="store",
+        default=CACHE_DIR,
+        type=lambda p: pathlib.Path(p).absolute(),
+    )
+
+    parser.add_argument(
+        "-w",
+        "--watch",
+        help="Keep running, and redraw the cards whenever the input YAML or an image it uses changes. Only the cards that changed are drawn again.",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--draft",
+        help="Quickly draw cards to check their layout: no background or logo, low resolution art and no compression. Cards are laid out exactly as they would be otherwise.",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--stream",
+        help="Write pages to the output as they are drawn, keeping at most this many cards (default: %(const)s) in memory.",
+        action="store",
+        nargs="?",
+        const=50,
+        default=None,
+        metavar="CARDS",
+        type=int,
+    )
+
+    parser.add_argument(
+        "--nup",
+        help="Lay the cards out on sheets of this paper size (as many as fit: 2x2 small cards, 1x2 large cards, 1 epic or super epic card) instead of one card per page.",
+        action="store",
+        default=None,
+        choices=["a4", "letter"],
+    )
+    parser.add_argument(
+        "-m",
+        "--margin",
+        help='Spacing between cards on a sheet with --nup, as "X Y" (e.g. "10mm 10mm").',
+        action="store",
+        default="0mm 0mm",
+        type=Spacing,
+    )
+
+    parser.add_argument(
+        "--split-by-size",
+        help="Write the cards of each size to a separate file (e.g. cards_Small.pdf), along with a manifest of which card went where (cards_manifest.json).",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--profile",
+        help="Write a report of how long each card took to lay out and draw to this file (CSV if it ends in .csv, JSON otherwise).",
+        action="store",
+        default=None,
+        metavar="REPORT",
+        type=lambda p: pathlib.Path(p).absolute(),
+    )
+    parser.add_argument(
+        "--cprofile",
+        help="Profile the whole run with cProfile, writing the stats to this file.",
+        action="store",
+        default=None,
+        metavar="STATS",
+        type=lambda p: pathlib.Path(p).absolute(),
+    )
+
+    return parser
+
+
+def render_args(**overrides):
+    """Returns the options cards are drawn with when none are given on the
+    command line, with `overrides` (e.g. the `input` and `output_path`)
+    replacing some of them. For drawing cards from other scripts."""
+    args = build_parser(input_required=False).parse_args([])
+    for name, value in overrides.items():
+        setattr(args, name, value)
+    return args
+
+
+if __name__ == "__main__":
+
+    parser = build_parser()
     args = parser.parse_args()
 
-    fonts = None
-    if args.fonts == "accurate":
-        try:
-            fonts = AccurateFonts()
-        except TTFError:
-            raise Exception(
-                "Failed to load accurate fonts, are you sure you used the correct file names?"
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.draft:
+        args.background = None
+        args.dpi = DRAFT_DPI
+    if args.stream is not None and args.stream < 1:
+        parser.error("--stream must be at least 1")
+    if args.nup is not None:
+        # Cards are only placed on a sheet once it is full, so they can't be
+        # drawn in separate batches
+        if args.jobs > 1 or args.incremental or args.stream is not None:
+            parser.error("--nup can't be used with --jobs, --incremental or --stream")
+    if args.split_by_size:
+        # Cards are routed to their size's file as they are drawn, which
+        # needs every card to be drawn in the same process
+        if args.jobs > 1 or args.incremental or args.stream is not None:
+            parser.error(
+                "--split-by-size can't be used with --jobs, --incremental or --stream"
             )
-    else:
-        fonts = FreeFonts()
+    if args.watch and (
+        args.nup is not None or args.split_by_size or args.stream is not None
+    ):
+        # Cards are kept one per PDF, to be reused when the deck changes
+        parser.error("--watch can't be used with --nup, --split-by-size or --stream")
+    if args.profile is not None and args.jobs > 1:
+        parser.error("--profile only works when rendering with a single job")
+
+    profiler = None
+    if args.cprofile is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    timer = None
+    if args.profile is not None:
+        from profiling import PhaseTimer
+
+        # Time this module's functions, not those of a second copy imported
+        # as `CardGenerator`
+        timer = PhaseTimer(sys.modules[__name__]).__enter__()
 
-    canvas = canvas.Canvas(str(args.output_path), pagesize=(0, 0))
+    use_cache_dir(args.cache_dir)
 
-    with open(args.input, "r") as stream:
+    if args.watch:
         try:
-            entries = yaml.load(stream, Loader=yaml.SafeLoader)
+            DeckWatcher(args).run()
+        except KeyboardInterrupt:
+            pass
+    else:
+        try:
+            render_deck(args)
         except yaml.YAMLError as exc:
             print(exc)
             exit()
 
-    for entry in entries:
-        image_path = None
-        if "image_path" in entry:
-            image_path = pathlib.Path(entry["image_path"])
-            if not image_path.is_absolute():
-                image_path = (args.input.parent / image_path).absolute()
-            if not image_path.exists():
-                raise ValueError(
-                    "Invalid `image_path` in `{}`: {}".format(
-                        entry["title"], entry["image_path"]
-                    )
-                )
+    image_index.save()
 
-        if args.type == "monster":
-            card = MonsterCard(
-                title=entry["title"],
-                subtitle=entry["subtitle"],
-                artist=entry.get("artist", None),
-                image_path=image_path or ASSET_DIR / "placeholder_monster.png",
-                background=args.background,
-                armor_class=entry["armor_class"],
-                max_hit_points=entry["max_hit_points"],
-                speed=entry["speed"],
-                strength=entry["strength"],
-                dexterity=entry["dexterity"],
-                constitution=entry["constitution"],
-                intelligence=entry["intelligence"],
-                wisdom=entry["wisdom"],
-                charisma=entry["charisma"],
-                challenge_rating=entry["challenge_rating"],
-                experience_points=entry["experience_points"],
-                source=entry["source"],
-                attributes=entry["attributes"],
-                abilities=entry.get("abilities", None),
-                actions=entry.get("actions", None),
-                reactions=entry.get("reactions", None),
-                legendary=entry.get("legendary", None),
-                fonts=fonts,
-                border_color=entry.get("color", "red"),
-                bleed=args.bleed,
-            )
-        elif args.type == "item":
-            card = ItemCard(
-                title=entry["title"],
-                subtitle=entry["subtitle"],
-                artist=entry.get("artist", None),
-                image_path=image_path or ASSET_DIR / "placeholder_item.png",
-                background=args.background,
-                description=entry["description"],
-                category=entry["category"],
-                subcategory=entry.get("subcategory", None),
-                fonts=fonts,
-                border_color=entry.get("color", "red"),
-                bleed=args.bleed,
-            )
+    if timer is not None:
+        from profiling import write_report
+
+        timer.__exit__(None, None, None)
+        write_report(timer, args.profile)
 
-        card.draw(canvas)
-    canvas.save()
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
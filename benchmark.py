@@ -0,0 +1,243 @@
+import argparse
+import json
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+ROOT = pathlib.Path(__file__).parent.resolve()
+
+# Python snippets timed in a fresh interpreter by the startup benchmark. The
+# last one imports everything drawing a card needs, i.e. what importing
+# CardGenerator used to cost before those imports were deferred.
+STARTUP_SCENARIOS = {
+    "interpreter": "pass",
+    "import CardGenerator": "import CardGenerator",
+    "import convert": "import convert",
+    "CardGenerator.py --help": None,
+    "import + drawing dependencies": (
+        "import CardGenerator\n"
+        "CardGenerator.load_fonts('free')\n"
+        "import reportlab.platypus, reportlab.pdfgen.canvas, reportlab.graphics.renderPDF\n"
+        "import svglib.svglib, PIL.Image, PyPDF2"
+    ),
+}
+
+
+# Decks rendered by the render benchmark, and the type of cards in each
+RENDER_DECKS = {
+    "goblin": (ROOT / "example" / "example_goblin.yaml", "monster"),
+    "badge": (ROOT / "example" / "example_badge.yaml", "item"),
+    "size_test": (ROOT / "test" / "size_test.yaml", "monster"),
+    "srd": (ROOT / "example" / "srd.yaml", "monster"),
+}
+
+
+def time_command(cmd, runs):
+    """Runs `cmd` `runs` times, returning the wall time of each run in ms"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def startup(args):
+    print(f"Startup time over {args.runs} runs (ms):")
+    print(f"{'':32} {'min':>8} {'median':>8}")
+    for name, snippet in STARTUP_SCENARIOS.items():
+        if snippet is None:
+            cmd = [sys.executable, str(ROOT / "CardGenerator.py"), "--help"]
+        else:
+            cmd = [sys.executable, "-c", snippet]
+        times = time_command(cmd, args.runs)
+        print(f"{name:32} {min(times):8.1f} {statistics.median(times):8.1f}")
+
+
+def render_deck(name):
+    """Renders one of `RENDER_DECKS` with the default options, timing each
+    phase of the render. Runs in a fresh process, so that nothing is cached
+    from a previous run."""
+    import CardGenerator
+    from profiling import PhaseTimer
+
+    path, card_type = RENDER_DECKS[name]
+    with tempfile.TemporaryDirectory() as tempdir:
+        tempdir = pathlib.Path(tempdir)
+        args = CardGenerator.render_args(
+            type=card_type,
+            input=path,
+            output_path=tempdir / "cards.pdf",
+            cache_dir=tempdir / "cache",
+        )
+        CardGenerator.use_cache_dir(args.cache_dir)
+
+        with PhaseTimer() as timer:
+            start = time.perf_counter()
+            fonts = CardGenerator.load_fonts(args.fonts)
+            with open(path, "r") as stream:
+                drawn = CardGenerator.render_cards(
+                    CardGenerator.iter_entries(stream), args.output_path, args, fonts
+                )
+            seconds = time.perf_counter() - start
+
+    layouts = {}
+    for card in timer.cards:
+        name = card["layout"] or "did not fit"
+        layout = layouts.setdefault(name, {"cards": 0, "seconds": 0.0})
+        layout["cards"] += 1
+        layout["seconds"] += card["seconds"]
+
+    return {
+        "cards": len(drawn),
+        "seconds": seconds,
+        "cards_per_second": len(drawn) / seconds,
+        "phases": dict(timer.totals),
+        "layouts": layouts,
+    }
+
+
+def median_results(runs):
+    """Combines several runs of a deck, taking the median of every number"""
+    first = runs[0]
+    if isinstance(first, dict):
+        keys = {key for run in runs for key in run}
+        return {
+            key: median_results([run[key] for run in runs if key in run])
+            for key in sorted(keys, key=str)
+        }
+    if isinstance(first, float):
+        return statistics.median(runs)
+    return first
+
+
+def render(args):
+    import multiprocessing
+
+    # Each run gets its own interpreter so in-memory caches (fonts, SVGs,
+    # paragraphs...) are cold, like they would be in a real run
+    context = multiprocessing.get_context("spawn")
+
+    results = {}
+    for name in args.decks:
+        runs = []
+        for _ in range(args.runs):
+            with context.Pool(1) as pool:
+                runs.append(pool.apply(render_deck, (name,)))
+        results[name] = median_results(runs)
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name) if baseline else None
+        print(
+            f"{name}: {result['cards']} cards in {result['seconds']:.2f}s "
+            f"({result['cards_per_second']:.2f} cards/s)"
+        )
+        rows = [("total", result["seconds"], base and base["seconds"])]
+        rows += [
+            (phase, seconds, base and base["phases"].get(phase))
+            for phase, seconds in result["phases"].items()
+        ]
+        rows += [
+            (
+                f"{layout} ({layout_result['cards']} cards)",
+                layout_result["seconds"],
+                base and base["layouts"].get(layout, {}).get("seconds"),
+            )
+            for layout, layout_result in result["layouts"].items()
+        ]
+        for label, seconds, base_seconds in rows:
+            line = f"  {label:32} {seconds:8.3f}s"
+            if base_seconds:
+                change = seconds / base_seconds - 1
+                line += f" {base_seconds:8.3f}s {change:+7.1%}"
+                # Tiny timings are too noisy to call a regression
+                if change > args.threshold and seconds - base_seconds > 0.05:
+                    line += "  REGRESSION"
+                    regressions.append((name, label))
+            print(line)
+
+    if args.save is not None:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if regressions:
+        sys.exit(
+            f"{len(regressions)} timings regressed by more than {args.threshold:.0%}"
+        )
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the card generator")
+    subparsers = parser.add_subparsers(required=True)
+
+    startup_parser = subparsers.add_parser(
+        "startup", help="Time how long the scripts take to start"
+    )
+    startup_parser.set_defaults(func=startup)
+    startup_parser.add_argument(
+        "-n",
+        "--runs",
+        help="How many times to run each scenario",
+        action="store",
+        default=10,
+        type=int,
+    )
+
+    render_parser = subparsers.add_parser(
+        "render", help="Time how long it takes to render some decks"
+    )
+    render_parser.set_defaults(func=render)
+    render_parser.add_argument(
+        "decks",
+        help="Which decks to render: {} (defaults to all of them)".format(
+            ", ".join(RENDER_DECKS)
+        ),
+        nargs="*",
+    )
+    render_parser.add_argument(
+        "-n",
+        "--runs",
+        help="How many times to render each deck, the median of each timing is reported",
+        action="store",
+        default=3,
+        type=int,
+    )
+    render_parser.add_argument(
+        "--save",
+        help="Save the results to a JSON file, to use as a baseline",
+        action="store",
+        type=pathlib.Path,
+    )
+    render_parser.add_argument(
+        "--compare",
+        help="Compare the results with a baseline saved by --save",
+        action="store",
+        type=pathlib.Path,
+    )
+    render_parser.add_argument(
+        "--threshold",
+        help="How much slower (as a fraction) a timing can be than the baseline before it is reported as a regression",
+        action="store",
+        default=0.1,
+        type=float,
+    )
+
+    args = parser.parse_args()
+
+    if args.func == render:
+        for deck in args.decks:
+            if deck not in RENDER_DECKS:
+                parser.error(f"unknown deck `{deck}`")
+        args.decks = args.decks or list(RENDER_DECKS)
+    args.func(args)
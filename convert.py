@@ -1,17 +1,27 @@
 import argparse
-import tempfile
+import re
+import contextlib
 import pathlib
 import zipfile
 import errno
+import functools
+import hashlib
+import itertools
+import json
 import os
 import shutil
 import xml.etree.ElementTree as ET
+from html.entities import html5
+from html.parser import HTMLParser
+from xml.sax.saxutils import escape
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
 from dataclasses import dataclass, asdict
 
 import yaml
-from bs4 import BeautifulSoup
 
-from CardGenerator import ExistingFile
+import CardGenerator
+from CardGenerator import ExistingFile, hash_file
 
 
 def noop(self, *args, **kw):
@@ -21,17 +31,186 @@ def noop(self, *args, **kw):
 yaml.emitter.Emitter.process_tag = noop
 
 
-def strip_tags(html):
-    """Strip unwanted HTML tags"""
-    soup = BeautifulSoup(html, "html.parser")
+class TagStripper(HTMLParser):
+    """Unwraps `<a>` tags from HTML, writing out the rest of the markup the
+    way BeautifulSoup's `html.parser` tree would be turned back into a
+    string (unclosed tags closed, stray end tags dropped, attributes sorted,
+    runs of whitespace between tags collapsed...), without building a tree.
+    """
+
+    VOID_TAGS = {
+        "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen",
+        "link", "menuitem", "meta", "param", "source", "track", "wbr",
+        "basefont", "bgsound", "command", "frame", "image", "isindex",
+        "nextid", "spacer",
+    }
+    PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+    RAW_TEXT_TAGS = {"script", "style"}
+    # Attributes holding a whitespace separated list, for any tag ("*") or
+    # specific ones
+    MULTI_VALUED_ATTRIBUTES = {
+        "*": {"class", "accesskey", "dropzone"},
+        "a": {"rel", "rev"},
+        "link": {"rel", "rev"},
+        "td": {"headers"},
+        "th": {"headers"},
+        "form": {"accept-charset"},
+        "object": {"archive"},
+        "area": {"rel"},
+        "icon": {"sizes"},
+        "iframe": {"sandbox"},
+        "output": {"for"},
+    }
+    UNWRAP_TAGS = {"a"}
+    WHITESPACE = " \n\t\f\r"
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.output = []
+        self.data = []
+        self.open_tags = []
+        self.closed_void_tags = []
+
+    def strip(self, html):
+        self.feed(html)
+        self.close()
+        self.end_data()
+        while self.open_tags:
+            self.pop_tag()
+        return "".join(self.output)
+
+    def end_data(self):
+        if not self.data:
+            return
+        data = "".join(self.data)
+        self.data = []
+
+        if not self.PRESERVE_WHITESPACE_TAGS.intersection(self.open_tags):
+            if not data.strip(self.WHITESPACE):
+                data = "\n" if "\n" in data else " "
+
+        parents = [tag for tag in self.open_tags if tag not in self.UNWRAP_TAGS]
+        if not parents or parents[-1] not in self.RAW_TEXT_TAGS:
+            data = escape(data)
+        self.output.append(data)
+
+    def pop_tag(self):
+        tag = self.open_tags.pop()
+        if tag not in self.UNWRAP_TAGS:
+            if tag in self.VOID_TAGS:
+                # Void tags have already been written out as `<tag/>`
+                return
+            self.output.append(f"</{tag}>")
+
+    def handle_starttag(self, tag, attrs, self_closing=False):
+        self.end_data()
+
+        multi_valued = self.MULTI_VALUED_ATTRIBUTES["*"].union(
+            self.MULTI_VALUED_ATTRIBUTES.get(tag, ())
+        )
+        values = {}
+        for name, value in attrs:
+            value = value or ""
+            if name in multi_valued:
+                value = " ".join(value.split())
+            values[name] = value
+
+        if tag not in self.UNWRAP_TAGS:
+            markup = [tag]
+            for name, value in sorted(values.items()):
+                value = escape(value)
+                quote = '"'
+                if '"' in value:
+                    if "'" in value:
+                        value = value.replace('"', "&quot;")
+                    else:
+                        quote = "'"
+                markup.append(f"{name}={quote}{value}{quote}")
+            end = "/>" if tag in self.VOID_TAGS else ">"
+            self.output.append("<" + " ".join(markup) + end)
+
+        self.open_tags.append(tag)
+        if tag in self.VOID_TAGS and not self_closing:
+            self.pop_tag()
+            self.closed_void_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, self_closing=True)
+        self.handle_endtag(tag, self_closing=True)
+
+    def handle_endtag(self, tag, self_closing=False):
+        if not self_closing and tag in self.closed_void_tags:
+            self.closed_void_tags.remove(tag)
+            return
+
+        self.end_data()
+        if tag in self.open_tags:
+            while self.open_tags[-1] != tag:
+                self.pop_tag()
+            self.pop_tag()
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_entityref(self, name):
+        character = html5.get(name + ";", html5.get(name))
+        self.handle_data(character if character is not None else "&" + name)
+
+    def handle_charref(self, name):
+        base, digits = 10, r"[0-9]+"
+        if name.startswith(("x", "X")):
+            name = name[1:]
+            base, digits = 16, r"[0-9a-f]+"
+
+        try:
+            number, extra = int(name, base), ""
+        except ValueError:
+            match = re.match(f"({digits})(.*)", name)
+            if match is None:
+                self.handle_data(name)
+                return
+            number, extra = int(match.group(1), base), match.group(2)
+
+        if number == 0 or number > 0x10FFFF or 0xD800 <= number <= 0xDFFF:
+            character = "\ufffd"
+        elif 0x80 <= number <= 0x9F:
+            # Most likely meant as Windows-1252
+            try:
+                character = bytes([number]).decode("cp1252")
+            except UnicodeDecodeError:
+                character = chr(number)
+        else:
+            character = chr(number)
+        self.handle_data(character + extra)
 
-    for a in soup.find_all("a"):
-        a.unwrap()
+    def handle_comment(self, data):
+        self.end_data()
+        self.output.append(f"<!--{data}-->")
 
-    return str(soup)
+    def handle_decl(self, decl):
+        self.end_data()
+        self.output.append(f"<!DOCTYPE {decl[len('DOCTYPE '):]}>\n")
+
+    def unknown_decl(self, data):
+        self.end_data()
+        if data.upper().startswith("CDATA["):
+            self.output.append(f"<![CDATA[{data[len('CDATA['):]}]]>")
+        else:
+            self.output.append(f"<?{data}?>")
+
+    def handle_pi(self, data):
+        self.end_data()
+        self.output.append(f"<?{data}>")
+
+
+def strip_tags(html):
+    """Strip unwanted HTML tags"""
+    return TagStripper().strip(html)
 
 
 ASSET_DIR = pathlib.Path(__file__).parent.resolve() / "assets"
+# Number of entries handed to a worker process at a time
+CHUNK_SIZE = 64
 
 
 @dataclass
@@ -132,132 +311,456 @@ def generate(args):
     print(args)
 
 
+class Manifest:
+    """Record of what has been converted into an output directory.
+
+    Every entry's data and YAML are kept by a hash of the element it was
+    converted from, and every image by the CRC and size of the zip member it
+    was copied from, so that converting a module again only redoes what
+    changed. Entries are only reused if they were converted by the same
+    version of this script.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.converter = hash_file(__file__)
+        self.complete = True
+        # [type, data, YAML] of each entry, by hash of its source element
+        self.entries = {}
+        # Source of each image, by path relative to the output directory
+        self.images = {}
+        self.used_entries = set()
+        self.used_images = set()
+
+    @classmethod
+    def load(cls, path):
+        """Loads the manifest at `path`, or returns None if there isn't one"""
+        manifest = cls(path)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        manifest.complete = data.get("complete", False)
+        manifest.images = data.get("images", {})
+        if data.get("converter") == manifest.converter:
+            manifest.entries = data.get("entries", {})
+        return manifest
+
+    def save(self, complete):
+        """Writes the manifest out. Once a conversion is complete, only what
+        it used is kept, otherwise everything is kept for the next run."""
+        entries, images = self.entries, self.images
+        if complete:
+            entries = {
+                digest: entry
+                for digest, entry in entries.items()
+                if digest in self.used_entries
+            }
+            images = {
+                path: source
+                for path, source in images.items()
+                if path in self.used_images
+            }
+
+        temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(temp_path, "w") as f:
+            # dumps() is much quicker than dump() for large manifests
+            f.write(
+                json.dumps(
+                    {
+                        "converter": self.converter,
+                        "complete": complete,
+                        "entries": entries,
+                        "images": images,
+                    }
+                )
+            )
+        os.replace(temp_path, self.path)
+
+
 def convert(args):
     if args.output_path is None:
         args.output_path = pathlib.Path(args.input.stem)
 
-    if args.overwrite:
-        try:
-            shutil.rmtree(args.output_path)
-        except FileNotFoundError:
+    # Output from a previous conversion is converted again incrementally,
+    # only redoing what changed. An interrupted conversion is always resumed.
+    manifest_path = args.output_path / "manifest.json"
+    manifest = Manifest.load(manifest_path)
+    if args.output_path.exists():
+        if manifest is not None and not manifest.complete:
             pass
+        elif not args.overwrite:
+            raise FileExistsError(
+                errno.EEXIST, os.strerror(errno.EEXIST), str(args.output_path)
+            )
+        elif manifest is None:
+            # Nothing is known about what is in there
+            shutil.rmtree(args.output_path)
+    if manifest is None:
+        manifest = Manifest(manifest_path)
 
     # Create output directory
-    args.output_path.mkdir()
-    (args.output_path / "images").mkdir()
-    (args.output_path / "images" / "items").mkdir()
-    (args.output_path / "images" / "monsters").mkdir()
-
-    if args.format == "encounterplus":
-        results = convert_encounterplus(args)
-
-    for entry_type, entries in results.items():
-        if len(entries):
-            with open(args.output_path / (entry_type + ".yaml"), "w") as f:
-                yaml.dump(entries, f, sort_keys=False)
-
-
-def convert_encounterplus(args):
-    with tempfile.TemporaryDirectory() as tempdir:
-        tempdir = pathlib.Path(tempdir)
-
-        # Extract module
-        with zipfile.ZipFile(args.input, "r") as zip_ref:
-            zip_ref.extractall(tempdir)
+    args.output_path.mkdir(exist_ok=True)
+    (args.output_path / "images").mkdir(exist_ok=True)
+    (args.output_path / "images" / "items").mkdir(exist_ok=True)
+    (args.output_path / "images" / "monsters").mkdir(exist_ok=True)
+
+    complete = False
+    # Data of the entries of each type, to draw once they are all converted
+    cards = {}
+    try:
+        if args.format == "encounterplus":
+            entries = convert_encounterplus(args, manifest)
+
+        # Entries are written out as they are converted, one YAML file per
+        # type
+        with contextlib.ExitStack() as stack:
+            # Closing the entries stops the image copies (which update the
+            # manifest) before the manifest is saved, even on errors
+            stack.enter_context(contextlib.closing(entries))
+            files = {}
+            for entry_type, entry_data, entry_yaml in entries:
+                if args.render:
+                    cards.setdefault(entry_type, []).append(entry_data)
+                if not args.yaml:
+                    continue
+                if entry_type not in files:
+                    files[entry_type] = stack.enter_context(
+                        open(args.output_path / (entry_type + ".yaml"), "w")
+                    )
+                files[entry_type].write(entry_yaml)
+
+        # Remove whatever previous conversions left that is no longer used,
+        # including YAML that wouldn't match what was just converted
+        for entry_type in ("item", "monster"):
+            if entry_type not in files:
+                (args.output_path / (entry_type + ".yaml")).unlink(missing_ok=True)
+        for path in set(manifest.images) - manifest.used_images:
+            (args.output_path / path).unlink(missing_ok=True)
+        complete = True
+    finally:
+        manifest.save(complete)
+
+    if args.render:
+        render(cards, args)
+
+
+def render(cards, args):
+    """Draws the data of the converted entries of each type (e.g. `monster`)
+    straight into `{type}.pdf` in the output directory, without going through
+    YAML"""
+    CardGenerator.use_cache_dir(args.cache_dir)
+    for entry_type, entries in cards.items():
+        render_args = CardGenerator.render_args(
+            type=entry_type,
+            # Image paths are relative to the output directory, where the
+            # YAML would be
+            input=args.output_path / (entry_type + ".yaml"),
+            output_path=args.output_path / (entry_type + ".pdf"),
+            jobs=args.jobs or os.cpu_count() or 1,
+            cache_dir=args.cache_dir,
+        )
+        if render_args.jobs > 1:
+            CardGenerator.render_cards_parallel(entries, render_args)
+        else:
+            CardGenerator.render_cards(
+                entries,
+                render_args.output_path,
+                render_args,
+                CardGenerator.load_fonts(render_args.fonts),
+            )
+    CardGenerator.image_index.save()
+
+
+def iter_elements(source, tags):
+    """Yields the children of the XML document's root element with one of
+    `tags`, as soon as each one has been parsed.
+
+    Each element is freed once the caller is done with it, so memory use does
+    not grow with the size of the document.
+    """
+    depth = 0
+    root = None
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            depth += 1
+            continue
 
-        compendium_path = tempdir / "compendium.xml"
-        if not compendium_path.exists():
+        depth -= 1
+        if depth == 1:
+            if element.tag in tags:
+                yield element
+            root.clear()
+
+
+# Numbers the temporary files images are copied to, as copies run on several
+# threads of the same process
+copy_count = itertools.count()
+
+
+def copy_member(module, name, path):
+    """Copies a member of a zip file to `path`, without extracting anything
+    else"""
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.{next(copy_count)}.tmp")
+    with module.open(name) as source, open(temp_path, "wb") as destination:
+        shutil.copyfileobj(source, destination)
+    os.replace(temp_path, path)
+
+
+def image_member(xml):
+    """Returns the zip member holding an item or monster's image, and where
+    it goes relative to the output directory (or None if it has no image)"""
+    image = xml.findtext("image")
+    if image is None:
+        return None
+    new_path = (
+        pathlib.Path("images")
+        / (xml.tag + "s")
+        / (xml.findtext("name") + pathlib.PurePosixPath(image).suffix)
+    )
+    return f"{xml.tag}s/{image}", new_path
+
+
+def element_hash(element):
+    """Hashes an element's tags, attributes and text, including all of its
+    descendants"""
+    digest = hashlib.sha1()
+    for node in element.iter():
+        # The element's own tail is outside of it (and may not have been
+        # parsed yet)
+        tail = node.tail if node is not element else None
+        digest.update(
+            repr((node.tag, len(node), node.attrib, node.text, tail)).encode()
+        )
+    return digest.hexdigest()
+
+
+def convert_entry(entry_xml, dump_yaml=True):
+    """Converts an item or monster, returning its type, its data and the
+    data as YAML (None unless `dump_yaml`)"""
+    process = {"item": process_item, "monster": process_monster}[entry_xml.tag]
+    item = process(entry_xml)
+
+    image = image_member(entry_xml)
+    if image is not None:
+        item.image_path = str(image[1])
+
+    # Strip unused fields
+    item_dict = asdict(
+        item, dict_factory=lambda x: {k: v for (k, v) in x if v is not None}
+    )
+    item_yaml = None
+    if dump_yaml:
+        item_yaml = yaml.dump([item_dict], sort_keys=False)
+    return entry_xml.tag, item_dict, item_yaml
+
+
+def convert_chunk(elements, dump_yaml):
+    return [convert_entry(element, dump_yaml) for element in elements]
+
+
+def convert_entries(entries, jobs=None, dump_yaml=True):
+    """Converts entries with `convert_entry()` in `jobs` worker processes (one
+    per CPU by default), yielding the results in order.
+
+    `entries` are (key, element) pairs, where the element may already have
+    been converted (e.g. by a previous run), in which case it is passed
+    through as it is. (key, result) pairs are yielded.
+
+    Elements are handed out in chunks, and only a couple of chunks per worker
+    are queued at once, so memory use doesn't grow with the number of
+    elements.
+    """
+
+    def needs_converting(element):
+        return isinstance(element, ET.Element)
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        for key, element in entries:
+            if needs_converting(element):
+                element = convert_entry(element, dump_yaml)
+            yield key, element
+        return
+
+    with ProcessPoolExecutor(jobs) as pool:
+        pending = deque()
+        while True:
+            chunk = list(itertools.islice(entries, CHUNK_SIZE))
+            if chunk:
+                elements = [e for _, e in chunk if needs_converting(e)]
+                future = None
+                if elements:
+                    future = pool.submit(convert_chunk, elements, dump_yaml)
+                pending.append((chunk, future))
+            if pending and (not chunk or len(pending) >= 2 * jobs):
+                chunk, future = pending.popleft()
+                results = iter(future.result() if future is not None else ())
+                for key, element in chunk:
+                    if needs_converting(element):
+                        element = next(results)
+                    yield key, element
+            elif not chunk:
+                return
+
+
+def convert_encounterplus(args, manifest):
+    """Yields the type, data and YAML of every item and monster in an
+    EncounterPlus module, in the order they appear in its compendium.
+
+    Only the entries and images that aren't already in `manifest` from a
+    previous conversion are converted (and copied), and the manifest is
+    updated as they are.
+    """
+    with zipfile.ZipFile(args.input, "r") as module, ThreadPoolExecutor() as pool:
+        names = set(module.namelist())
+        if "compendium.xml" not in names:
             raise FileNotFoundError(
-                errno.ENOENT, os.strerror(errno.ENOENT), compendium_path.name
+                errno.ENOENT, os.strerror(errno.ENOENT), "compendium.xml"
             )
 
-        tree = ET.parse(compendium_path)
-        root = tree.getroot()
-
-        def move_image(xml, output_path):
-            image = xml.findtext("image")
-            if image is not None:
-                image_path = tempdir / (xml.tag + "s") / image
-                new_path = (
-                    pathlib.Path("images")
-                    / (xml.tag + "s")
-                    / (xml.findtext("name") + image_path.suffix)
-                )
-                image_path.rename(output_path / new_path)
-                return str(new_path)
-            return None
-
-        tags = {"item": process_item, "monster": process_monster}
+        # Images are copied straight out of the module in the background,
+        # while the compendium is being converted. Entries with the same name
+        # share an image path, which ends up with the last one's image. The
+        # source and copy (None if it was already there) of each path:
+        copies = {}
+
+        def record_copy(path, source, copy):
+            # Only if a later entry hasn't replaced the copy in the meantime
+            if copies[path][1] is not copy or copy.cancelled():
+                return
+            if copy.exception() is None:
+                manifest.images[path] = source
+
+        def copy_image(xml, output_path):
+            image = image_member(xml)
+            if image is None:
+                return
+            member, new_path = image
+            if member not in names:
+                raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), member)
+
+            info = module.getinfo(member)
+            source = f"{info.CRC:08x}:{info.file_size}"
+            path = new_path.as_posix()
+            manifest.used_images.add(path)
+            if path in copies:
+                previous_source, previous = copies[path]
+                if previous_source == source:
+                    return
+                # Only one copy writes a path at a time
+                if previous is not None and not previous.cancel():
+                    wait([previous])
+            elif manifest.images.get(path) == source and (output_path / path).exists():
+                copies[path] = (source, None)
+                return
+
+            manifest.images.pop(path, None)
+            copy = pool.submit(copy_member, module, member, output_path / new_path)
+            copies[path] = (source, copy)
+            copy.add_done_callback(functools.partial(record_copy, path, source))
+
+        def prepare(elements, output_path):
+            for xml in elements:
+                copy_image(xml, output_path)
+                digest = element_hash(xml)
+                manifest.used_entries.add(digest)
+                entry = manifest.entries.get(digest)
+                if entry is None or (args.yaml and entry[2] is None):
+                    entry = xml
+                yield digest, entry
+
+        tags = {"item", "monster"}
 
-        results = {}
-        for tag, process in tags.items():
-            entries = []
-            for entry_xml in root.findall(tag):
-                item = process(entry_xml)
-
-                item.image_path = move_image(entry_xml, args.output_path)
-
-                # Strip unused fields
-                item_dict = asdict(
-                    item, dict_factory=lambda x: {k: v for (k, v) in x if v is not None}
-                )
-                entries.append(item_dict)
-            results[tag] = entries
-
-        return results
+        try:
+            with module.open("compendium.xml") as compendium:
+                entries = prepare(iter_elements(compendium, tags), args.output_path)
+                for digest, entry in convert_entries(entries, args.jobs, args.yaml):
+                    manifest.entries[digest] = entry
+                    yield entry
+
+            # Raise any errors from copying the images
+            for source, copy in copies.values():
+                if copy is not None:
+                    copy.result()
+        except BaseException:
+            # Only wait for the copies that have already started
+            pool.shutdown(cancel_futures=True)
+            raise
+
+
+def gather_children(element):
+    """Returns the text of the first child with each tag (like `findtext()`),
+    and the children grouped by tag (like `findall()`), in a single pass over
+    the element's children"""
+    texts = {}
+    children = {}
+    for child in element:
+        children.setdefault(child.tag, []).append(child)
+        if child.tag not in texts:
+            texts[child.tag] = child.text or ""
+    return texts, children
 
 
 def process_item(item_xml):
-    item = {}
+    texts, _ = gather_children(item_xml)
 
     # Construct subtitle
-    subtitle = f'{item_xml.findtext("rarity")}'
-    attune = item_xml.findtext("attune")
+    subtitle = f'{texts.get("rarity")}'
+    attune = texts.get("attune")
     if attune is not None:
         subtitle += f" ({attune})"
 
     # Clean description
-    description = item_xml.findtext("text", default="")
+    description = texts.get("text", "")
     description = strip_tags(description)
-    description = description.replace(
-        f"<i>Source: {item_xml.findtext('source')}</i>", ""
-    )
+    description = description.replace(f"<i>Source: {texts.get('source')}</i>", "")
     description = description.replace("\u2013", "-")
     description = description.strip()
 
     item_data = ItemCardData(
-        title=item_xml.findtext("name"),
+        title=texts.get("name"),
         subtitle=subtitle,
         artist=None,  # Artist
         image_path=None,  # Image
         description=description,
-        category=item_type_to_text[item_xml.findtext("type")],
+        category=item_type_to_text[texts.get("type")],
         subcategory=None,
-        # source=item_xml.findtext("source"),
-        # source=item_xml.findtext("weight"),
-        # source=item_xml.findtext("value"),
+        # source=texts.get("source"),
+        # source=texts.get("weight"),
+        # source=texts.get("value"),
     )
 
     return item_data
 
 
-def process_entry(monster, tag):
-    entries = {}
-    for entry in monster.findall(tag):
-        name = entry.findtext("name").strip()
+def process_entry(entries):
+    processed = {}
+    for entry in entries:
+        texts, children = gather_children(entry)
+        name = texts.get("name").strip()
         if name.endswith("."):
             name = name[:-1]
         name = name.replace("\u2013", "-")
         text = ""
-        for line in entry.findall("text"):
-            line.text = line.text.replace("\n", "\n<br/>")
-            text += (line.text or "") + "<br/>"
-        entries[name] = text.strip()
-    return entries
+        for line in children.get("text", []):
+            text += (line.text or "").replace("\n", "\n<br/>") + "<br/>"
+        processed[name] = text.strip()
+    return processed
+
+
+def ability_score(score):
+    """Formats an ability score along with its modifier, e.g. `14 (+2)`"""
+    return f"{score} ({(int(score) - 10) // 2:+d})"
 
 
 def process_monster(monster_xml):
-    monster_name = monster_xml.findtext("name")
+    texts, children = gather_children(monster_xml)
+    monster_name = texts.get("name")
     attributes = {}
 
     tags = {
@@ -268,23 +771,25 @@ def process_monster(monster_xml):
         "conditionImmune": "Condition Immunities",
     }
     for tag, name in tags.items():
-        text = monster_xml.findtext(tag)
+        text = texts.get(tag)
         if text:
             attributes[name] = text
 
-    senses = monster_xml.findtext("senses")
-    passive_perception = monster_xml.findtext("passive")
+    senses = texts.get("senses")
+    passive_perception = texts.get("passive")
     if senses:
         attributes["Senses"] = f"{senses}, Passive Perception {passive_perception}"
     else:
         attributes["Senses"] = f"Passive Perception {passive_perception}"
 
-    languages = monster_xml.findtext("languages") or "-"
+    languages = texts.get("languages") or "-"
     attributes["Languages"] = languages
 
     # Legendary Actions:
     legendary_actions = []
-    legendary_tags = monster_xml.findall("legendary")
+    legendary_tags = [
+        gather_children(legendary) for legendary in children.get("legendary", [])
+    ]
     i = 0
     heading_map = {
         "REGIONAL EFFECTS": "Regional Effects",
@@ -292,7 +797,8 @@ def process_monster(monster_xml):
     }
 
     while i < len(legendary_tags):
-        name = legendary_tags[i].findtext("name").strip()
+        legendary_texts, legendary_children = legendary_tags[i]
+        name = legendary_texts.get("name").strip()
 
         if (name or "").upper() in heading_map:
             name = heading_map[name.upper()]
@@ -300,7 +806,7 @@ def process_monster(monster_xml):
             continue
 
         text = ""
-        for line in legendary_tags[i].findall("text"):
+        for line in legendary_children.get("text", []):
             text += (line.text or "") + "<br/>"
         text = text.strip()
 
@@ -316,7 +822,7 @@ def process_monster(monster_xml):
 
     # Source
     source = ""
-    description = monster_xml.findtext("description")
+    description = texts.get("description")
     if description:
         last_line = description.splitlines()[-1]
         last_line = last_line.replace("<i>", "").replace("</i>", "")
@@ -324,7 +830,7 @@ def process_monster(monster_xml):
         if last_line.startswith(start_string):
             source = last_line[len(start_string) :].split(",")[0]
 
-    actions = process_entry(monster_xml, "action")
+    actions = process_entry(children.get("action", []))
     for key in list(actions.keys()):
         if key and key.startswith("Variant: "):
             del actions[key]
@@ -340,28 +846,26 @@ def process_monster(monster_xml):
         text = text.strip()
         actions[key] = text
 
-    abilities = process_entry(monster_xml, "trait")
+    abilities = process_entry(children.get("trait", []))
     for key in list(abilities.keys()):
         abilities[key] = abilities[key].replace("<i></i> ", "")
 
     monster_data = MonsterCardData(
         title=monster_name,
-        subtitle=f"{monster_xml.findtext('type')}, {monster_xml.findtext('alignment')}",
+        subtitle=f"{texts.get('type')}, {texts.get('alignment')}",
         artist=None,
         image_path=None,
-        armor_class=monster_xml.findtext("ac").strip(),
-        max_hit_points=monster_xml.findtext("hp"),
-        speed=monster_xml.findtext("speed"),
-        strength=f"{monster_xml.findtext('str')} ({(int(monster_xml.findtext('str'))-10 )//2:+d})",
-        dexterity=f"{monster_xml.findtext('dex')} ({(int(monster_xml.findtext('str'))-10 )//2:+d})",
-        constitution=f"{monster_xml.findtext('con')} ({(int(monster_xml.findtext('str'))-10 )//2:+d})",
-        intelligence=f"{monster_xml.findtext('int')} ({(int(monster_xml.findtext('str'))-10 )//2:+d})",
-        wisdom=f"{monster_xml.findtext('wis')} ({(int(monster_xml.findtext('str'))-10 )//2:+d})",
-        charisma=f"{monster_xml.findtext('cha')} ({(int(monster_xml.findtext('str'))-10 )//2:+d})",
-        challenge_rating=monster_xml.findtext("cr"),
-        experience_points=cr_to_xp[monster_xml.findtext("cr")]
-        if monster_xml.findtext("cr")
-        else "0",
+        armor_class=texts.get("ac").strip(),
+        max_hit_points=texts.get("hp"),
+        speed=texts.get("speed"),
+        strength=ability_score(texts.get("str")),
+        dexterity=ability_score(texts.get("dex")),
+        constitution=ability_score(texts.get("con")),
+        intelligence=ability_score(texts.get("int")),
+        wisdom=ability_score(texts.get("wis")),
+        charisma=ability_score(texts.get("cha")),
+        challenge_rating=texts.get("cr"),
+        experience_points=cr_to_xp[texts.get("cr")] if texts.get("cr") else "0",
         source=source or None,
         attributes=attributes,
         abilities=abilities,
@@ -389,7 +893,7 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "--overwrite",
-        help="Delete and overwrite converted data if it already exists",
+        help="Overwrite converted data if it already exists, only converting again what changed",
         action="store_true",
     )
     parser.add_argument(
@@ -401,6 +905,32 @@ if __name__ == "__main__":
         choices=["encounterplus"],
         dest="format",
     )
+    parser.add_argument(
+        "--render",
+        help="Also draw the cards, into monster.pdf and item.pdf in the output directory, straight from the converted data. Cards are drawn with CardGenerator.py's default options (fonts, bleed, background...).",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--no-yaml",
+        help="Don't write the converted data to YAML files, removing any left by an earlier conversion (with --render).",
+        action="store_false",
+        dest="yaml",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory to keep caches in between runs when drawing the cards (with --render).",
+        action="store",
+        default=CardGenerator.CACHE_DIR,
+        type=lambda p: pathlib.Path(p).absolute(),
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Number of worker processes to convert entries (and draw cards) with (default: one per CPU).",
+        action="store",
+        default=None,
+        type=int,
+    )
     parser.add_argument(
         "input",
         help="Path to input data file",
@@ -408,4 +938,10 @@ if __name__ == "__main__":
         type=ExistingFile,
     )
     args = parser.parse_args()
+
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if not args.yaml and not args.render:
+        parser.error("--no-yaml only makes sense with --render")
+
     args.func(args)
@@ -0,0 +1,207 @@
+from collections import OrderedDict
+
+from reportlab.lib.units import mm
+from reportlab.platypus.flowables import Flowable
+from reportlab.platypus.paragraph import (
+    Paragraph,
+    _processed_frags,
+    cleanBlockQuotedText,
+)
+
+
+# Draws a line across the frame, unless it is at the top of the frame, in which
+# case nothing is drawn
+class LineDivider(Flowable):
+    def __init__(
+        self,
+        xoffset=0,
+        width=None,
+        fill_color="red",
+        line_height=0.25 * mm,
+        spacing=1 * mm,
+    ):
+        self.xoffset = xoffset
+        self.width = width
+        self.fill_color = fill_color
+        self.spacing = spacing
+        self.line_height = line_height
+        self.height = self.line_height + self.spacing
+
+    def _at_top(self):
+        at_top = False
+        frame = getattr(self, "_frame", None)
+        if frame:
+            at_top = getattr(frame, "_atTop", None)
+        return at_top
+
+    def wrap(self, *args):
+        if self._at_top():
+            return (0, 0)
+        else:
+            return (self.width, self.height)
+
+    def draw(self):
+        if not self._at_top():
+            canvas = self.canv
+            canvas.setFillColor(self.fill_color)
+            canvas.rect(self.xoffset, 0, self.width, self.line_height, stroke=0, fill=1)
+
+
+class KeepTogether(Flowable):
+    def __init__(self, flowables):
+        self.flowables = flowables
+        self._available_height = None
+        self._available_width = None
+
+    def wrap(self, aW, aH):
+        self._available_width = aW
+        self._available_height = aH
+
+        height = 0
+        width = 0
+        for flowable in self.flowables:
+            w, h = flowable.wrap(aW, 0xFFFFFFFF)
+            height += flowable.getSpaceBefore()
+            height += h
+            height += flowable.getSpaceAfter()
+            if w > width:
+                width = w
+        return width, height
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        y -= self.flowables[0].getSpaceBefore()
+        for flowable in self.flowables[::-1]:
+            y += flowable.getSpaceBefore()
+            width, height = flowable.wrap(self._available_width, self._available_height)
+            flowable.drawOn(canvas, x, y, _sW=_sW)
+            y += height
+            y += flowable.getSpaceAfter()
+            self._available_height -= (
+                flowable.getSpaceBefore() + height + flowable.getSpaceBefore()
+            )
+
+
+class CardImage(Flowable):
+    """An image drawn at a fixed size through an image registry (see
+    `CardGenerator.ImageRegistry`), rather than being loaded by the flowable"""
+
+    def __init__(self, path, width, height, registry):
+        Flowable.__init__(self)
+        self.path = path
+        self.width = width
+        self.height = height
+        self.registry = registry
+        self.hAlign = "CENTER"
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        self.registry.draw(
+            self.canv, self.path, 0, 0, self.width, self.height, mask="auto"
+        )
+
+
+class LRUCache:
+    """Dictionary like cache that evicts the least recently used entries once
+    it holds `maxsize` of them"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            return None
+        return self._entries[key]
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+def _style_key(style):
+    if style is None:
+        return None
+    return tuple(
+        (key, repr(value))
+        for key, value in sorted(style.__dict__.items())
+        if key != "parent"
+    )
+
+
+# The same paragraphs (headings, common actions, attributes...) show up on many
+# cards, and each card is laid out for several sizes. Parsing their markup and
+# breaking them into lines is the bulk of the layout work, so both results are
+# shared between every paragraph with the same markup, style and width.
+parsed_paragraphs = LRUCache(2048)
+broken_lines = LRUCache(4096)
+
+
+class CachedParagraph(Paragraph):
+    """Paragraph that reuses the parsed fragments and line breaks of identical
+    paragraphs"""
+
+    def _setup(self, text, style, bulletText, frags, cleaner):
+        # Paragraphs split from another one are given their fragments directly
+        if frags is not None or text is None or cleaner is not cleanBlockQuotedText:
+            self._memo_key = None
+            super()._setup(text, style, bulletText, frags, cleaner)
+            return
+
+        self._memo_key = (text, bulletText, self.caseSensitive, _style_key(style))
+        parsed = parsed_paragraphs.get(self._memo_key)
+        if parsed is None:
+            super()._setup(text, style, bulletText, frags, cleaner)
+            parsed_paragraphs.put(
+                self._memo_key, (self.text, self.style, self.bulletText, self.frags)
+            )
+        else:
+            text, style, bulletText, frags = parsed
+            super()._setup(text, style, bulletText, frags, cleaner)
+
+    def breakLines(self, width):
+        if self._memo_key is None:
+            return super().breakLines(width)
+
+        # Breaking lines replaces the parsed fragments with a processed
+        # version, which is then broken differently if wrapped again
+        key = (
+            self._memo_key,
+            tuple(width) if isinstance(width, (tuple, list)) else width,
+            _processed_frags(self.frags),
+        )
+        broken = broken_lines.get(key)
+        if broken is None:
+            bl_para = super().breakLines(width)
+            broken_lines.put(
+                key,
+                (
+                    bl_para,
+                    self.frags,
+                    self._width_max,
+                    self._splitLongWordCount,
+                    self._hyphenations,
+                ),
+            )
+            return bl_para
+
+        (
+            bl_para,
+            self.frags,
+            self._width_max,
+            self._splitLongWordCount,
+            self._hyphenations,
+        ) = broken
+        self.height = 0
+        return bl_para
@@ -0,0 +1,127 @@
+import re
+import itertools
+
+from reportlab.lib.pagesizes import A4, LETTER, landscape
+from reportlab.lib.units import mm, cm, inch
+from reportlab.pdfgen.canvas import Canvas
+
+
+PAPER_SIZES = {
+    "a4": landscape(A4),
+    "letter": landscape(LETTER),
+}
+
+UNITS = {"pt": 1, "mm": mm, "cm": cm, "in": inch}
+
+
+def parse_length(length):
+    """Parses a length such as `10mm` or `0.5in` into points"""
+    match = re.fullmatch(r"\s*([0-9]*\.?[0-9]+)\s*(pt|mm|cm|in)\s*", length)
+    if match is None:
+        raise ValueError(f"Invalid length `{length}`, expected e.g. `10mm`")
+    return float(match.group(1)) * UNITS[match.group(2)]
+
+
+def parse_spacing(spacing):
+    """Parses the "X Y" spacing between cards (like pdfjam's `--delta`) into
+    points"""
+    parts = spacing.split()
+    if len(parts) != 2:
+        raise ValueError("Margin must be in format 'X Y' (e.g., '10mm 10mm')")
+    return tuple(parse_length(part) for part in parts)
+
+
+def grid_size(card_size, paper_size, spacing=(0, 0)):
+    """Returns how many columns and rows of cards fit on a sheet unscaled,
+    with `spacing` between them. For A4 and Letter this is 2x2 for small
+    cards, 1x2 for large cards and 1x1 for epic and super epic cards, the
+    same layouts split-by-size.py uses."""
+    columns = max(
+        1, int((paper_size[0] + spacing[0]) // (card_size[0] + spacing[0]))
+    )
+    rows = max(1, int((paper_size[1] + spacing[1]) // (card_size[1] + spacing[1])))
+    return columns, rows
+
+
+def grid_positions(card_size, paper_size, columns, rows, spacing=(0, 0)):
+    """Returns the bottom left corner of each card in a grid of `columns` by
+    `rows` cards centred on a sheet, filled left to right then top to bottom
+    (like pdfjam with `--noautoscale`)"""
+    grid_width = columns * card_size[0] + (columns - 1) * spacing[0]
+    grid_height = rows * card_size[1] + (rows - 1) * spacing[1]
+    left = (paper_size[0] - grid_width) / 2
+    top = (paper_size[1] + grid_height) / 2
+    return [
+        (
+            left + column * (card_size[0] + spacing[0]),
+            top - (row + 1) * card_size[1] - row * spacing[1],
+        )
+        for row in range(rows)
+        for column in range(columns)
+    ]
+
+
+class ImposedCanvas(Canvas):
+    """Canvas that lays the pages drawn on it out in a grid on sheets of
+    paper, rather than giving each one its own page.
+
+    Every page is captured as a form. Pages of each size go on their own
+    sheets, with as many in a grid (centred on the sheet, filled left to
+    right then top to bottom) as fit unscaled. A sheet is written out as soon
+    as it is full, and partly filled ones when the canvas is saved.
+    """
+
+    def __init__(self, filename, paper="a4", spacing=(0, 0), **kwargs):
+        super().__init__(filename, pagesize=PAPER_SIZES[paper], **kwargs)
+        self._paper_size = PAPER_SIZES[paper]
+        self._spacing = spacing
+        self._card_size = None
+        self._card_count = itertools.count()
+        # Forms waiting to be placed on a sheet, per page size
+        self._pending = {}
+
+    def setPageSize(self, size):
+        # Each card sets its size before it is drawn, which starts its form
+        if self._card_size is None:
+            self._card_size = tuple(size)
+            self.beginForm(
+                f"imposed_card_{next(self._card_count)}", 0, 0, size[0], size[1]
+            )
+
+    def showPage(self):
+        if self._card_size is None:
+            # Nothing has been drawn since the last card
+            return
+
+        name = self._formData[0]
+        size = self._card_size
+        self.endForm()
+        self._card_size = None
+
+        pending = self._pending.setdefault(size, [])
+        pending.append(name)
+        columns, rows = grid_size(size, self._paper_size, self._spacing)
+        if len(pending) == columns * rows:
+            self._draw_sheet(size, pending)
+            pending.clear()
+
+    def save(self):
+        for size, pending in self._pending.items():
+            if pending:
+                self._draw_sheet(size, pending)
+        self._pending = {}
+        super().save()
+
+    def _draw_sheet(self, card_size, names):
+        columns, rows = grid_size(card_size, self._paper_size, self._spacing)
+        positions = grid_positions(
+            card_size, self._paper_size, columns, rows, self._spacing
+        )
+
+        super().setPageSize(self._paper_size)
+        for name, (x, y) in zip(names, positions):
+            self.saveState()
+            self.translate(x, y)
+            self.doForm(name)
+            self.restoreState()
+        super().showPage()
@@ -0,0 +1,221 @@
+import io
+import hashlib
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import (
+    ArrayObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    NumberObject,
+    StreamObject,
+)
+
+
+# Page attributes that can be inherited from a parent node in the page tree
+INHERITABLE_ATTRIBUTES = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+
+class PdfStitcher:
+    """Writes pages taken from other PDFs into a new PDF.
+
+    Every object a page uses is written out as soon as the page is added, so
+    memory use does not grow with the number of pages. Objects are content
+    addressed: an object that is byte for byte identical to one that has
+    already been written (e.g. the same background image or form used by
+    pages from different source PDFs) is only written once.
+    """
+
+    CATALOG = 1
+    PAGES = 2
+
+    def __init__(self, output):
+        if hasattr(output, "write"):
+            self._file = output
+            self._owns_file = False
+        else:
+            self._file = open(output, "wb")
+            self._owns_file = True
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._offsets = {}
+        self._next_number = self.PAGES + 1
+        self._kids = ArrayObject()
+        # Object number for each object digest that has been written
+        self._digests = {}
+        # Object number each source object was written as, per source PDF
+        self._copied = {}
+        # Source objects that are being copied, used to detect cycles
+        self._pending = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._kids)
+
+    def append(self, pdf):
+        """Adds every page of `pdf`, a path or file like object"""
+        reader = PdfReader(pdf)
+        for page in reader.pages:
+            self.add_page(page)
+        self.forget(reader)
+
+    def add_page(self, page):
+        """Adds a page (a `PyPDF2.PageObject` from another PDF, or a new page
+        dictionary that may refer to objects returned by `add_object`)"""
+        copied = DictionaryObject()
+        for key, value in page.items():
+            if key != "/Parent":
+                copied[NameObject(key)] = self._copy(value)
+        for key in INHERITABLE_ATTRIBUTES:
+            if key not in copied:
+                value = _inherited(page, key)
+                if value is not None:
+                    copied[NameObject(key)] = self._copy(value)
+        copied[NameObject("/Parent")] = self._ref(self.PAGES)
+
+        number = self._allocate()
+        self._write(number, copied)
+        self._kids.append(self._ref(number))
+
+    def add_object(self, obj):
+        """Writes `obj` (which may refer to objects in other PDFs) and returns
+        a reference to it"""
+        return self._ref(self._store(self._copy(obj)))
+
+    def forget(self, reader):
+        """Drops the record of which objects were copied from `reader`. Once
+        all of its pages have been added this keeps memory flat."""
+        self._copied.pop(id(reader), None)
+
+    def close(self):
+        if self._file is None:
+            return
+
+        pages = DictionaryObject()
+        pages[NameObject("/Type")] = NameObject("/Pages")
+        pages[NameObject("/Kids")] = self._kids
+        pages[NameObject("/Count")] = NumberObject(len(self._kids))
+        self._write(self.PAGES, pages)
+
+        catalog = DictionaryObject()
+        catalog[NameObject("/Type")] = NameObject("/Catalog")
+        catalog[NameObject("/Pages")] = self._ref(self.PAGES)
+        self._write(self.CATALOG, catalog)
+
+        xref_offset = self._file.tell()
+        self._file.write(b"xref\n0 %d\n" % self._next_number)
+        self._file.write(b"0000000000 65535 f \n")
+        for number in range(1, self._next_number):
+            self._file.write(b"%010d 00000 n \n" % self._offsets[number])
+        self._file.write(
+            b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (self._next_number, self.CATALOG, xref_offset)
+        )
+
+        if self._owns_file:
+            self._file.close()
+        self._file = None
+
+    def _ref(self, number):
+        return IndirectObject(number, 0, self)
+
+    def _allocate(self):
+        number = self._next_number
+        self._next_number += 1
+        return number
+
+    def _write(self, number, obj, data=None):
+        if data is None:
+            data = _serialise(obj)
+        self._offsets[number] = self._file.tell()
+        self._file.write(b"%d 0 obj\n" % number)
+        self._file.write(data)
+        self._file.write(b"\nendobj\n")
+
+    def _store(self, obj, number=None):
+        """Writes a copied object unless it has been written before, returning
+        its object number"""
+        data = _serialise(obj)
+        if number is None:
+            digest = hashlib.sha1(data).digest()
+            number = self._digests.get(digest)
+            if number is not None:
+                return number
+            number = self._allocate()
+            self._digests[digest] = number
+        self._write(number, obj, data)
+        return number
+
+    def _copy(self, obj):
+        """Copies `obj`, writing out any objects it refers to"""
+        if isinstance(obj, IndirectObject):
+            if obj.pdf is self:
+                # Already written by this stitcher, e.g. by add_object()
+                return obj
+
+            copied = self._copied.setdefault(id(obj.pdf), {})
+            key = (obj.idnum, obj.generation)
+            if key in copied:
+                return self._ref(copied[key])
+
+            pending = self._pending.setdefault(id(obj.pdf), {})
+            if key in pending:
+                # Reference cycle, the object needs its number before it has
+                # been written (and can't be deduplicated)
+                if pending[key] is None:
+                    pending[key] = self._allocate()
+                return self._ref(pending[key])
+
+            pending[key] = None
+            try:
+                direct = self._copy(obj.get_object())
+            finally:
+                number = pending.pop(key)
+            copied[key] = self._store(direct, number)
+            return self._ref(copied[key])
+
+        if isinstance(obj, StreamObject):
+            copied = type(obj)()
+            copied._data = obj._data
+            for key, value in obj.items():
+                if key != "/Length":
+                    copied[NameObject(key)] = self._copy(value)
+            return copied
+
+        if isinstance(obj, DictionaryObject):
+            copied = DictionaryObject()
+            for key, value in obj.items():
+                copied[NameObject(key)] = self._copy(value)
+            return copied
+
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._copy(value) for value in obj)
+
+        return obj
+
+
+def _serialise(obj):
+    stream = io.BytesIO()
+    obj.write_to_stream(stream, None)
+    return stream.getvalue()
+
+
+def _inherited(page, key):
+    node = page.get("/Parent")
+    while node is not None:
+        node = node.get_object()
+        if key in node:
+            return node[key]
+        node = node.get("/Parent")
+    return None
+
+
+def stitch_pdfs(pdfs, output):
+    """Concatenates the pages of several PDFs (paths or file like objects)"""
+    with PdfStitcher(output) as stitcher:
+        for pdf in pdfs:
+            stitcher.append(pdf)
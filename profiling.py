@@ -0,0 +1,243 @@
+import csv
+import json
+import time
+import inspect
+import functools
+import importlib
+import contextlib
+from collections import defaultdict
+
+
+# The phases a render is broken down into, and the functions (or methods, on
+# every class that defines them) that make up each phase. Targets are looked
+# up in the card generator module unless another module is given before a `:`
+PHASES = {
+    "yaml_parse": ["iter_entries", "DeckCache.load"],
+    "image_probe": ["ImageIndex.info"],
+    "image_load": ["reportlab.pdfgen.canvas:Canvas.drawImage"],
+    "logo": ["load_svg", "reportlab.graphics.renderPDF:draw"],
+    "fill_frames": ["CardLayout.fill_frames"],
+    "draw_frames": ["CardLayout._draw_frames"],
+    "draw_front": ["CardLayout._draw_front"],
+    "draw_back": ["CardLayout._draw_back"],
+    "save": ["reportlab.pdfgen.canvas:Canvas.save"],
+}
+
+
+def _subclasses(cls):
+    yield cls
+    for subclass in cls.__subclasses__():
+        yield from _subclasses(subclass)
+
+
+def _targets(module, target):
+    """Yields the (object, attribute) pairs to patch for a phase target"""
+    if ":" in target:
+        module_name, target = target.split(":")
+        module = importlib.import_module(module_name)
+
+    owner = module
+    path = target.split(".")
+    for part in path[:-1]:
+        owner = getattr(owner, part)
+    name = path[-1]
+
+    if isinstance(owner, type):
+        for cls in _subclasses(owner):
+            if name in vars(cls):
+                yield cls, name
+    else:
+        yield owner, name
+
+
+class PhaseTimer:
+    """Measures how long a render spends in each of `PHASES`, and how long each
+    card took to draw.
+
+    Used as a context manager, it patches the functions making up each phase
+    (and `CardGenerator.draw`) of `module`, the card generator module, for its
+    duration. Phases are timed exclusively: time spent in a phase that was
+    entered from another one (e.g. probing an image while drawing the front of
+    a card) only counts towards the inner phase, so the phases add up to the
+    total time spent in them.
+    """
+
+    def __init__(self, module=None, phases=PHASES):
+        if module is None:
+            import CardGenerator as module
+        self.module = module
+        self.phases = phases
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+        self._stack = []
+        self._depth = defaultdict(int)
+        self.cards = []
+        self._attempts = None
+        self._patched = []
+
+    def __enter__(self):
+        generator = self.module.CardGenerator
+        self._patch(generator, "layout", self._wrap_layout)
+        self._patch(generator, "draw", self._wrap_draw)
+        self._patch(self.module.CardLayout, "fits", self._wrap_fits)
+        for phase, targets in self.phases.items():
+            for target in targets:
+                for obj, attribute in _targets(self.module, target):
+                    self._patch(
+                        obj, attribute, functools.partial(self._wrap, phase)
+                    )
+        return self
+
+    def __exit__(self, *exc):
+        for obj, attribute, original in reversed(self._patched):
+            setattr(obj, attribute, original)
+        self._patched = []
+
+    def _patch(self, obj, attribute, wrap):
+        original = vars(obj)[attribute]
+        self._patched.append((obj, attribute, original))
+        setattr(obj, attribute, wrap(original))
+
+    def _wrap_layout(self, layout):
+        @functools.wraps(layout)
+        def wrapper(card, canvas):
+            card_layout, split = layout(card, canvas)
+            card._chosen_layout = card_layout
+            return card_layout, split
+
+        return wrapper
+
+    def _wrap_fits(self, fits):
+        @functools.wraps(fits)
+        def wrapper(card_layout, canvas, split):
+            start = time.perf_counter()
+            result = fits(card_layout, canvas, split)
+            if self._attempts is not None:
+                self._attempts.append(
+                    {
+                        "layout": type(card_layout).__name__,
+                        "split": split,
+                        "fits": result,
+                        "seconds": time.perf_counter() - start,
+                    }
+                )
+            return result
+
+        return wrapper
+
+    def _wrap_draw(self, draw):
+        @functools.wraps(draw)
+        def wrapper(card, *args, **kwargs):
+            self._attempts = []
+            totals = dict(self.totals)
+            start = time.perf_counter()
+            try:
+                result = draw(card, *args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                attempts, self._attempts = self._attempts, None
+            card_layout = getattr(card, "_chosen_layout", None)
+            self.cards.append(
+                {
+                    "title": card._kwargs["title"],
+                    "layout": type(card_layout).__name__ if card_layout else None,
+                    "seconds": seconds,
+                    "attempts": attempts,
+                    "phases": {
+                        phase: total - totals.get(phase, 0.0)
+                        for phase, total in self.totals.items()
+                        if total != totals.get(phase, 0.0)
+                    },
+                }
+            )
+            return result
+
+        return wrapper
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        # Re-entering a phase (e.g. an overridden method calling super())
+        # is part of the outer call
+        if self._depth[name]:
+            self._depth[name] += 1
+            try:
+                yield
+            finally:
+                self._depth[name] -= 1
+            return
+
+        self._depth[name] += 1
+        self.calls[name] += 1
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._stack.pop()
+            self.totals[name] += elapsed - nested
+            if self._stack:
+                self._stack[-1] += elapsed
+            self._depth[name] -= 1
+
+    def _wrap(self, phase, function):
+        if inspect.isgeneratorfunction(function):
+
+            @functools.wraps(function)
+            def generator(*args, **kwargs):
+                iterator = function(*args, **kwargs)
+                while True:
+                    # Only the time taken to produce each item belongs to the
+                    # phase, not what the consumer does with it
+                    with self.phase(phase):
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            return
+                    yield item
+
+            return generator
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.phase(phase):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+
+# Per card phases included in CSV reports
+REPORT_PHASES = ["image_probe", "image_load", "logo", "fill_frames", "draw_frames"]
+
+
+def write_report(timer, path):
+    """Writes the cards timed by `timer` to `path`, as CSV if its name ends in
+    `.csv` and JSON otherwise"""
+    if path.suffix.lower() != ".csv":
+        with open(path, "w") as f:
+            json.dump(
+                {"phases": dict(timer.totals), "cards": timer.cards}, f, indent=2
+            )
+        return
+
+    # One row per layout attempt, along with the details of its card
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["card", "title", "layout", "seconds"]
+            + [f"{phase}_seconds" for phase in REPORT_PHASES]
+            + ["attempt_layout", "attempt_split", "attempt_fits", "attempt_seconds"]
+        )
+        for number, card in enumerate(timer.cards, 1):
+            row = [number, card["title"], card["layout"] or "", card["seconds"]]
+            row += [card["phases"].get(phase, 0.0) for phase in REPORT_PHASES]
+            for attempt in card["attempts"] or [{}]:
+                writer.writerow(
+                    row
+                    + [
+                        attempt.get("layout", ""),
+                        attempt.get("split", ""),
+                        attempt.get("fits", ""),
+                        attempt.get("seconds", ""),
+                    ]
+                )
@@ -2,9 +2,19 @@ import PyPDF2
 from collections import defaultdict
 import os
 import argparse
-import subprocess
 import sys
-import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from PyPDF2.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    FloatObject,
+    NameObject,
+)
+
+from imposition import PAPER_SIZES, grid_positions, parse_spacing
+from pdfstitch import PdfStitcher
 
 # Define size names
 SIZE_NAMES = {
@@ -22,41 +32,54 @@ def get_size_name(width, height):
 def split_pdf_by_size(input_file):
     """Split a PDF into multiple files based on page dimensions"""
 
-    # Open the PDF
-    reader = PyPDF2.PdfReader(input_file)
+    # Open the PDF. Given a path PyPDF2 would read all of it into memory, given
+    # a file it only reads objects from it as they are needed.
     size_groups = defaultdict(list)
-
-    # Group pages by size
-    print(f"Analyzing {len(reader.pages)} pages...")
-    for i, page in enumerate(reader.pages):
-        width = float(page.mediabox.width)
-        height = float(page.mediabox.height)
-        # Round to avoid floating point precision issues
-        size_key = f"{round(width)}x{round(height)}"
-        size_groups[size_key].append(i)
+    base_name = os.path.splitext(input_file)[0]
+    writers = {}
+
+    with open(input_file, 'rb') as input_stream:
+        reader = PyPDF2.PdfReader(input_stream)
+
+        # Group pages by size, copying each page into its group's file as it
+        # is classified. Every group is written at the same time, in a single
+        # pass.
+        print(f"Analyzing {len(reader.pages)} pages...")
+        try:
+            for i, page in enumerate(reader.pages):
+                width = float(page.mediabox.width)
+                height = float(page.mediabox.height)
+                # Round to avoid floating point precision issues
+                size_key = f"{round(width)}x{round(height)}"
+                size_groups[size_key].append(i)
+
+                if size_key not in writers:
+                    # Get friendly name
+                    friendly_name = get_size_name(*map(int, size_key.split('x')))
+                    writers[size_key] = PdfStitcher(f"{base_name}_{friendly_name}.pdf")
+
+                # Objects shared by pages (e.g. the background image and
+                # fonts) are only written once per group
+                writers[size_key].add_page(page)
+
+                # Once copied, objects don't need to stay in memory. Each
+                # writer remembers what it has already copied, so shared
+                # objects are only read again by groups that haven't needed
+                # them yet.
+                reader.resolved_objects.clear()
+        finally:
+            for writer in writers.values():
+                writer.close()
 
     # Create output files for each size group
-    base_name = os.path.splitext(input_file)[0]
     output_files = []
 
     for size, page_indices in size_groups.items():
         # Get friendly name
         friendly_name = get_size_name(*map(int, size.split('x')))
 
-        # Create a new PDF writer for this size group
-        writer = PyPDF2.PdfWriter()
-
-        # Add all pages of this size to the writer
-        for idx in page_indices:
-            writer.add_page(reader.pages[idx])
-
         # Generate output filename with friendly name
         output_filename = f"{base_name}_{friendly_name}.pdf"
-
-        # Write the PDF
-        with open(output_filename, 'wb') as output_file:
-            writer.write(output_file)
-
         output_files.append(output_filename)
 
         # Print summary
@@ -68,96 +91,130 @@ def split_pdf_by_size(input_file):
 
     return output_files, size_groups
 
-def run_pdfjam_command(cmd):
-    """Execute a pdfjam command"""
-    try:
-        print(f"Running: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode == 0:
-            print("✓ Success")
-        else:
-            print(f"✗ Error: {result.stderr}")
-            return False
-    except Exception as e:
-        print(f"✗ Failed to run command: {e}")
-        return False
-    return True
-
-def process_nup(size_groups, base_name, do_merge=True, margin=None):
-    """Generate and optionally run N-up commands"""
+def page_form(stitcher, page):
+    """Writes the contents of a page as a form XObject, returning a reference
+    to it"""
+    contents = page["/Contents"].get_object()
+    if isinstance(contents, ArrayObject):
+        form = DecodedStreamObject()
+        form.set_data(b"\n".join(c.get_object().get_data() for c in contents))
+        form = form.flate_encode()
+    else:
+        # Reuse the encoded contents as they are
+        form = type(contents)()
+        form._data = contents._data
+        for key in ("/Filter", "/DecodeParms"):
+            if key in contents:
+                form[NameObject(key)] = contents[key]
+
+    form[NameObject("/Type")] = NameObject("/XObject")
+    form[NameObject("/Subtype")] = NameObject("/Form")
+    form[NameObject("/BBox")] = ArrayObject(
+        FloatObject(value) for value in page.mediabox
+    )
+    form[NameObject("/Resources")] = page.get("/Resources", DictionaryObject())
+    return stitcher.add_object(form)
+
+
+def nup_pdf(input_file, output_file, nup, margin=None):
+    """Lay the pages of a PDF out on landscape A4 sheets, `nup` ("CxR") pages
+    at a time, without scaling them. Each page is placed on its sheet as a
+    form, so it is copied as is."""
+    columns, rows = map(int, nup.split('x'))
+    spacing = parse_spacing(margin) if margin else (0, 0)
+    paper_size = PAPER_SIZES["a4"]
+
+    with open(input_file, 'rb') as input_stream, PdfStitcher(output_file) as output:
+        reader = PyPDF2.PdfReader(input_stream)
+        pages = reader.pages
+        for start in range(0, len(pages), columns * rows):
+            sheet_pages = [pages[i] for i in range(start, min(start + columns * rows, len(pages)))]
+            card_size = (
+                float(sheet_pages[0].mediabox.width),
+                float(sheet_pages[0].mediabox.height),
+            )
+            positions = grid_positions(card_size, paper_size, columns, rows, spacing)
+
+            xobjects = DictionaryObject()
+            content = []
+            for i, (page, (x, y)) in enumerate(zip(sheet_pages, positions)):
+                name = f"/Card{i}"
+                xobjects[NameObject(name)] = page_form(output, page)
+                x -= float(page.mediabox.left)
+                y -= float(page.mediabox.bottom)
+                content.append(f"q 1 0 0 1 {x:.4f} {y:.4f} cm {name} Do Q")
+
+            content_stream = DecodedStreamObject()
+            content_stream.set_data("\n".join(content).encode())
+
+            sheet = DictionaryObject()
+            sheet[NameObject("/Type")] = NameObject("/Page")
+            sheet[NameObject("/MediaBox")] = ArrayObject(
+                FloatObject(value) for value in (0, 0, *paper_size)
+            )
+            resources = DictionaryObject()
+            resources[NameObject("/XObject")] = xobjects
+            sheet[NameObject("/Resources")] = resources
+            sheet[NameObject("/Contents")] = output.add_object(content_stream)
+            output.add_page(sheet)
+
+            # Once copied, objects don't need to stay in memory
+            reader.resolved_objects.clear()
+
+    return output_file
+
+
+def process_nup(size_groups, base_name, do_merge=True, margin=None, jobs=None):
+    """Lay out each group of cards on sheets, in parallel"""
     print("\n" + "="*50)
     print("N-up Processing:")
     print("="*50)
 
     # Optimal layouts for each card type
     nup_settings = {
-        "357x252": {"nup": "2x2", "landscape": True},   # Small: 4 per page, landscape
-        "714x252": {"nup": "1x2", "landscape": True},   # Large: 2 per page, landscape
-        "714x357": None,                                # Epic: Skip N-up
-        "714x536": None                                 # Super Epic: Skip N-up
+        "357x252": "2x2",   # Small: 4 per page
+        "714x252": "1x2",   # Large: 2 per page
+        "714x357": None,    # Epic: Skip N-up
+        "714x536": None     # Super Epic: Skip N-up
     }
 
-    nup_files = []
+    nup_jobs = []
     skipped = []
 
     for size, pages in size_groups.items():
         friendly_name = get_size_name(*map(int, size.split('x')))
-        settings = nup_settings.get(size)
+        nup = nup_settings.get(size)
 
         # Skip N-up for Epic and Super Epic
-        if settings is None:
+        if nup is None:
             skipped.append(friendly_name)
             print(f"\n# {friendly_name} cards ({size}) - {len(pages)} pages:")
             print(f"# Skipping N-up processing (keeping as single pages)")
             continue
 
-        nup = settings["nup"]
-        use_landscape = settings["landscape"]
-
         filename = f"{base_name}_{friendly_name}.pdf"
         output = f"{base_name}_{friendly_name}_merged.pdf"
-        nup_files.append(output)
 
-        orientation = "landscape" if use_landscape else "portrait"
         print(f"\n# {friendly_name} cards ({size}) - {len(pages)} pages:")
-        print(f"# Layout: {nup} = {eval(nup.replace('x', '*'))} cards per sheet ({orientation})")
+        print(f"# Layout: {nup} = {eval(nup.replace('x', '*'))} cards per sheet")
         if margin:
             print(f"# Margin: {margin}")
+        print(f"# Output: {output}")
 
-        cmd = [
-            "pdfjam",
-            "--nup", nup,
-            "--noautoscale", "true",  # Keep original size
-            "--paper", "a4paper"
-        ]
+        nup_jobs.append((filename, output, nup, margin))
 
-        # Add margin if specified
-        if margin:
-            cmd.extend(["--delta", margin])
-
-        # Only add landscape flag when needed
-        if use_landscape:
-            cmd.append("--landscape")
-
-        cmd.extend([
-            "--outfile", output,
-            filename
-        ])
-
-        if do_merge:
-            if not run_pdfjam_command(cmd):
-                print("Stopping due to error.")
-                return None
-        else:
-            # Format command for display
-            cmd_str = f"pdfjam --nup {nup} --noautoscale true \\\n"
-            cmd_str += f"       --paper a4paper"
-            if margin:
-                cmd_str += f" --delta '{margin}'"
-            if use_landscape:
-                cmd_str += " --landscape"
-            cmd_str += f" \\\n       --outfile {output} {filename}"
-            print(cmd_str)
+    nup_files = []
+    if do_merge and nup_jobs:
+        with ProcessPoolExecutor(jobs) as executor:
+            futures = [executor.submit(nup_pdf, *job) for job in nup_jobs]
+            for future in futures:
+                try:
+                    nup_files.append(future.result())
+                    print(f"✓ Created {nup_files[-1]}")
+                except Exception as e:
+                    print(f"✗ Error: {e}")
+                    print("Stopping due to error.")
+                    return None
 
     if skipped:
         print(f"\nNote: {', '.join(skipped)} cards kept as single pages (no N-up processing)")
@@ -173,7 +230,7 @@ Examples:
   %(prog)s cards.pdf                              # Split and merge (default)
   %(prog)s cards.pdf --margin "10mm 10mm"         # Add 10mm margins
   %(prog)s cards.pdf --margin "0.5in 0.25in"      # Different X/Y margins
-  %(prog)s cards.pdf --no-merge                   # Just split, show commands
+  %(prog)s cards.pdf --no-merge                   # Just split
 
 Margin format:
   "X Y" where X is horizontal spacing and Y is vertical spacing
@@ -189,9 +246,11 @@ Card types:
 
     parser.add_argument('input_pdf', help='Input PDF file path')
     parser.add_argument('--no-merge', action='store_true',
-                        help='Only split and show commands without running N-up merge')
+                        help='Only split, without creating the N-up layouts')
     parser.add_argument('-m', '--margin', type=str, default=None,
                         help='Margin/spacing between cards (e.g., "10mm 10mm")')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Number of size groups to lay out at once (default: one per CPU)')
 
     args = parser.parse_args()
 
@@ -202,29 +261,22 @@ Card types:
 
     # Validate margin format if provided
     if args.margin:
-        margin_parts = args.margin.strip().split()
-        if len(margin_parts) != 2:
-            print("Error: Margin must be in format 'X Y' (e.g., '10mm 10mm')")
+        try:
+            parse_spacing(args.margin)
+        except ValueError as e:
+            print(f"Error: {e}")
             sys.exit(1)
 
     # Determine if we should do merge (default is True)
     do_merge = not args.no_merge
 
-    # Check for required tools if merging
-    if do_merge:
-        if shutil.which('pdfjam') is None:
-            print("Error: 'pdfjam' is not installed or not in PATH!")
-            print("Please install pdfjam first.")
-            print("Alternatively, use --no-merge to just split the PDF.")
-            sys.exit(1)
-
     try:
         # Split the PDF
         base_name = os.path.splitext(args.input_pdf)[0]
         output_files, size_groups = split_pdf_by_size(args.input_pdf)
 
         # Process N-up
-        nup_files = process_nup(size_groups, base_name, do_merge=do_merge, margin=args.margin)
+        nup_files = process_nup(size_groups, base_name, do_merge=do_merge, margin=args.margin, jobs=args.jobs)
 
         # Summary
         print("\n" + "="*50)